@@ -1,13 +1,10 @@
+import csv
 import sys
-import joblib
-import pandas as pd
 from functools import partial
-from functools import reduce
-from sklearn.preprocessing import StandardScaler
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QObject, QThread, Qt, pyqtSignal
 from PyQt6.QtWidgets import (
     QApplication,
-    QGridLayout,
+    QProgressBar,
     QLineEdit,
     QMainWindow,
     QPushButton,
@@ -16,18 +13,24 @@ from PyQt6.QtWidgets import (
     QComboBox,
     QWidget,
     QLabel,
-    QScrollArea,
+    QListView,
     QGroupBox,
 )
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
 
+# pandas, sklearn and matplotlib are imported on first use so the window can show immediately
+
+TEAMS_PATH = './data/currentyeardata.csv'
 WINDOW_WIDTH = 1000
 WINDOW_HEIGHT = 700
 DISPLAY_HEIGHT = 35
 BUTTON_HEIGHT = 30
 BUTTON_WIDTH = 120
 
+def readTeams(path):
+    # Just the Squad column, without pulling in pandas
+    with open(path, newline='') as f:
+        return [row['Squad'] for row in csv.DictReader(f)]
+
 class AppWindow(QMainWindow):
     ###Main window GUI/View###
     def __init__(self):
@@ -43,6 +46,7 @@ class AppWindow(QMainWindow):
         self._createOutputButton()
         self._createOutput()
         self._createHistoryButton()
+        self._createLoadingStatus()
 
     def _createMainTitle(self):
         self.mainTitle = QLabel("<h1>Predicting Match Outcomes</h1>")
@@ -52,24 +56,30 @@ class AppWindow(QMainWindow):
 
     def _createTeamSelection(self):
         teamsLayout = QHBoxLayout()
-        currentyeardata = pd.read_csv('project\data\currentyeardata.csv')
-        teams = currentyeardata.loc[:, 'Squad']
+        teams = readTeams(TEAMS_PATH)
 
         self.teamSelection1 = QComboBox(self)
-        for col, val in enumerate(teams):
-            self.teamSelection1.addItem(val)
         teamsLayout.addWidget(self.teamSelection1)
 
         self.teamSelection2 = QComboBox(self)
-        for col, val in enumerate(teams):
-            self.teamSelection2.addItem(val)
         teamsLayout.addWidget(self.teamSelection2)
 
+        self.setTeams(teams)
         self.generalLayout.addLayout(teamsLayout)
 
+    def setTeams(self, teams):
+        for teamSelection in (self.teamSelection1, self.teamSelection2):
+            current = teamSelection.currentText()
+            teamSelection.clear()
+            teamSelection.addItems(teams)
+            if current in teams:
+                teamSelection.setCurrentText(current)
+
     def _createOutputButton(self):
         self.outputButton = QPushButton("Predict Outcome")
         self.outputButton.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
+        # Enabled once the model has finished loading
+        self.outputButton.setEnabled(False)
         self.generalLayout.addWidget(self.outputButton)
 
     def _createOutput(self):
@@ -81,10 +91,10 @@ class AppWindow(QMainWindow):
         self.outputDisplay.setReadOnly(True)
         outputLayout.addWidget(self.outputDisplay)
 
-        fig = Figure(figsize=(4,4))
-        self.axes = fig.add_subplot()
-        self.canvas = FigureCanvas(fig)
-        outputLayout.addWidget(self.canvas)
+        # The chart canvas is created on the first prediction
+        self.canvas = None
+        self.outputLayout = outputLayout
+        outputLayout.addStretch()
 
         self.generalLayout.addLayout(outputLayout)
 
@@ -93,6 +103,24 @@ class AppWindow(QMainWindow):
         self.historyButton.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
         self.generalLayout.addWidget(self.historyButton)
 
+    def _createLoadingStatus(self):
+        self.loadingBar = QProgressBar()
+        self.loadingBar.setRange(0, 100)
+        self.loadingBar.setFixedHeight(DISPLAY_HEIGHT // 2)
+        self.generalLayout.addWidget(self.loadingBar)
+
+    def setLoadingProgress(self, stage, percent):
+        self.loadingBar.setFormat(f"{stage}... %p%")
+        self.loadingBar.setValue(percent)
+
+    def setModelReady(self):
+        self.loadingBar.hide()
+        self.outputButton.setEnabled(True)
+
+    def setLoadingFailed(self, message):
+        self.loadingBar.hide()
+        self.outputDisplay.setText(f"Failed to load model: {message}")
+
     def _createSeasonsButton(self):
         self.seasonButton = QPushButton("Season")
         self.seasonButton.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
@@ -113,21 +141,95 @@ class AppWindow(QMainWindow):
 
     def updateOutputGraph(self, probas):
         labels = ["Home Win", "Draw", "Away Win"]
+        if self.canvas is None:
+            from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+            from matplotlib.figure import Figure
+            fig = Figure(figsize=(4,4))
+            self.axes = fig.add_subplot()
+            self.canvas = FigureCanvas(fig)
+            self.outputLayout.insertWidget(1, self.canvas)
         self.axes.cla()
         self.axes.pie(probas, labels=labels, autopct='%1.1f%%')
         self.canvas.draw()
 
+OUTCOME_NAMES = ["Home Win", "Draw", "Away Win"]
+HISTORY_PAGE_SIZE = 100
+
+class HistoryModel(QAbstractListModel):
+    ###Read-only view of PredModel.history, newest first, exposed a page at a time###
+    def __init__(self, history):
+        super().__init__()
+        self.history = history
+        self._reset()
+
+    def _reset(self):
+        # history may be a bounded RecentHistory, whose length stops growing once full
+        self.appended = self._appendedCount()
+        self.known = len(self.history)
+        self.loaded = min(self.known, HISTORY_PAGE_SIZE)
+
+    def _appendedCount(self):
+        return getattr(self.history, 'appended', len(self.history))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        # Rows are formatted only when the view paints them
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        entry = self.entry(index.row())
+        if entry is None:
+            return "(no longer held in memory)"
+        return f"{entry['HomeTeam']} vs {entry['AwayTeam']}: {OUTCOME_NAMES[int(entry['Pred'][0])]}"
+
+    def entry(self, row):
+        # Counted back from the newest entry, allowing for predictions made since the last refresh
+        back = row + self._appendedCount() - self.appended
+        return self.history[-1 - back] if back < len(self.history) else None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < self.known
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(HISTORY_PAGE_SIZE, self.known - self.loaded)
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def refresh(self):
+        # Predictions made since the last refresh appear at the top; entries evicted from the buffer drop off the bottom
+        added = self._appendedCount() - self.appended
+        if added <= 0:
+            return
+        if added >= len(self.history):
+            self.beginResetModel()
+            self._reset()
+            self.endResetModel()
+            return
+        self.beginInsertRows(QModelIndex(), 0, added - 1)
+        self.appended += added
+        self.loaded += added
+        self.endInsertRows()
+        self.known = len(self.history)
+        if self.loaded > self.known:
+            self.beginRemoveRows(QModelIndex(), self.known, self.loaded - 1)
+            self.loaded = self.known
+            self.endRemoveRows()
+
 class HistoryWindow(QWidget):
     def __init__(self, history):
         super().__init__()
         self.setWindowTitle("Prediction History")
         self.setFixedSize(WINDOW_WIDTH-350, WINDOW_HEIGHT)
+        self.history = history
         self.generalLayout = QVBoxLayout(self)
-        self._createHistoryLabel(history)
-        scroll = QScrollArea()
-        scroll.setWidget(self.groupBox)
-        scroll.setWidgetResizable(False)
-        self.generalLayout.addWidget(scroll)
+        self._createHistoryList(history)
+        # One chart, redrawn for whichever entry is selected
+        self.canvas = None
+        self.chartLayout = QVBoxLayout()
+        self.generalLayout.addLayout(self.chartLayout)
+        self.selectLatest()
 
     def _createMainTitle(self):
         self.mainTitle = QLabel("<h1>Prediction History</h1>")
@@ -135,190 +237,67 @@ class HistoryWindow(QWidget):
         self.mainTitle.setAlignment(Qt.AlignmentFlag.AlignHCenter)
         self.generalLayout.addWidget(self.mainTitle)
 
-    def _createHistoryLabel(self, history):
+    def _createHistoryList(self, history):
         self.groupBox = QGroupBox("Prediction History")
-        if not history:
-            self.historyLabel = QLabel("No prediction history.")
-            tempLayout = QHBoxLayout()
-            tempLayout.addWidget(self.historyLabel)
-            self.groupBox.setLayout(tempLayout)
-        else:
-            self.historyStack = {}
-            self.graphStack = {}
-            historyLayout = QGridLayout()
-            for i in range(len(history)):
-                # Label
-                key = history[i]['HomeTeam'] + history[i]['AwayTeam']
-                if (history[i]['Pred'][0] == 0):
-                    result = "Home Win"
-                elif (history[i]['Pred'][0] == 1):
-                    result = "Draw"
-                elif (history[i]['Pred'][0] == 2):
-                    result = "Away Win"
-                self.historyStack[key] = QLabel(f"Home Team: {history[i]['HomeTeam']}, Away Team: {history[i]['AwayTeam']}, Result: {result}")
-                historyLayout.addWidget(self.historyStack[key], i, 0)
-
-                # Graph
-                fig = Figure(figsize=(2,1))
-                self.axes = fig.add_subplot()
-                self.graphStack[key] = FigureCanvas(fig)
-                probas = history[i]["Proba"][0]
-                labels = ["Home Win", "Draw", "Away Win"]
-                self.axes.pie(probas, labels=labels, autopct='%1.1f%%')
-                self.graphStack[key].draw()
-                historyLayout.addWidget(self.graphStack[key], i, 1)
-                  
-            self.groupBox.setLayout(historyLayout)
-
-class PredModel:
-    ###Model###
-    def __init__(self):
-        rawdata = self.retrieveData()
-        matchesData = self.storeData(rawdata)
-        self.currentYearData = self.scaleData(matchesData)
-        print("Data Loaded")
-
-        self.predictingModel = joblib.load('./models/randomtree.sav')
-        # self.predictingModel = joblib.load('project\models\\logisticreg.sav')
-        print("Model loaded")
-
-        self.history = [] #stack of history
-
-    def retrieveData(self) :
-        # Get from data source
-        yearURL = 'https://fbref.com/en/comps/9/2022-2023/2022-2023-Premier-League-Stats'
-        year = pd.read_html(yearURL)
-
-        # Calculate the average number of games played in the season so far
-        temp = pd.DataFrame(year[0])
-        averageGamesPlayed = temp.loc[:, 'MP'].mean()
-
-        # Clean standard stats
-        standard = year[2].drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','Unnamed: 3_level_0','Playing Time','Expected', 'Per 90 Minutes'], axis=1, level=0)
-        standard.columns = standard.columns.droplevel()
-        standard = standard.drop(columns=['G+A','G-PK','PK','PKatt'])
-        standard[['Gls','Ast','CrdY','CrdR','PrgC','PrgP']] = standard[['Gls','Ast','CrdY','CrdR','PrgC','PrgP']].div(averageGamesPlayed)
-
-        # Clean goalkeeping stats
-        goalkeeping = year[4]
-        goalkeeping.columns = goalkeeping.columns.droplevel()
-        goalkeeping = goalkeeping[['Squad','Saves']]
-        goalkeeping[['Saves']] = goalkeeping[['Saves']].div(averageGamesPlayed)
-
-        # Clean shooting stats  
-        shooting = year[8].drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','Expected'], axis=1, level=0)
-        shooting.columns = shooting.columns.droplevel()
-        shooting = shooting[['Squad','Sh','SoT']]
-        shooting[['Sh','SoT']] = shooting[['Sh','SoT']].div(averageGamesPlayed)
-
-        # Clean pass types stats
-        passtypes = year[12].drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','Unnamed: 3_level_0','Corner Kicks','Outcomes'], axis=1, level=0)
-        passtypes.columns = passtypes.columns.droplevel()
-        passtypes = passtypes[['Squad','FK','TB','Sw','Crs','CK']]
-        passtypes[['FK','TB','Sw','Crs','CK']] = passtypes[['FK','TB','Sw','Crs','CK']].div(averageGamesPlayed)
-
-        # Clean creativity stats
-        creativity = year[14].drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','SCA Types','GCA Types'], axis=1, level=0)
-        creativity.columns = creativity.columns.droplevel()
-        creativity = creativity[['Squad','SCA','GCA']]
-        creativity[['SCA','GCA']] = creativity[['SCA','GCA']].div(averageGamesPlayed)
-
-        # Clean defensive stats
-        defensive = year[16].drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','Challenges','Unnamed: 16_level_0'],axis=1,level=0)
-        defensive.columns = defensive.columns.droplevel()
-        defensive = defensive[['Squad','TklW','Blocks','Int','Clr','Err']]
-        defensive[['TklW','Blocks','Int','Clr','Err']] = defensive[['TklW','Blocks','Int','Clr','Err']].div(averageGamesPlayed)
-
-        # Clean possesion stats
-        possession = year[18].drop(
-            columns=['Unnamed: 1_level_0','Unnamed: 3_level_0','Touches','Take-Ons','Carries','Receiving'],axis=1,level=0)
-        possession.columns = possession.columns.droplevel()
-
-        # Clean misc stats
-        misc = year[22].drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','Aerial Duels'],axis=1,level=0)
-        misc.columns = misc.columns.droplevel()
-        misc = misc[['Squad','Fls','Fld','Off','PKwon','PKcon','Recov']]
-        misc[['Fls','Fld','Off','PKwon','PKcon','Recov']] = misc[['Fls','Fld','Off','PKwon','PKcon','Recov']].div(averageGamesPlayed)
-
-        currentYear = {'standard' : standard, 'goalkeeping' : goalkeeping, 'shooting' : shooting, 'passtypes' : passtypes,
-            'creativity' : creativity, 'defensive' : defensive, 'possession' : possession, 'misc' : misc}
-
-        dataframe = [currentYear['standard'],currentYear['goalkeeping'],currentYear['shooting'],
-                    currentYear['passtypes'],currentYear['defensive'],currentYear['possession'],currentYear['misc']]
-
-        df_merged = reduce(lambda  left,right: pd.merge(left,right,on=['Squad'],how='outer'), dataframe) 
-        return df_merged
-
-    def storeData(self, rawdata):
-        matchesData = pd.DataFrame()
-        teams = rawdata.loc[:, 'Squad']
-        for i in range(len(teams)):
-            temp = list(teams)
-            temp.remove(teams[i])
-            for j in range(len(temp)):
-                data = self.cleanAndProcessData(teams[i], temp[j], rawdata)
-                matchesData = pd.concat([matchesData, data], ignore_index=True, axis=0)
-
-        return matchesData
-
-    def scaleData(self, matchesData):
-        matchups = matchesData[['HomeTeam','AwayTeam']].copy()
-        matchstats = matchesData.drop(columns=['HomeTeam', 'AwayTeam'])
-
-        scaler = StandardScaler()
-        scaler.fit(matchstats)
-        scaledMatchstats = pd.DataFrame(scaler.transform(matchstats))
-
-        scaledData = pd.merge(matchups, scaledMatchstats, left_index=True, right_index=True)
-
-        return scaledData
-    
-    def cleanAndProcessData(self, homeTeam, awayTeam, rawdata):
-        # Retrieve corresponding team stats from data and rename variables `home_'
-        homeTeamStats = rawdata.loc[rawdata['Squad'] == homeTeam]
-        homeTeamStats = homeTeamStats.drop(columns=['CrdY','CrdR'])
-        homeTeamStats = homeTeamStats.rename(columns={c: 'home_'+ c for c in homeTeamStats.columns if c not in ['Squad']})
-        homeTeamStats = homeTeamStats.rename(columns={'Squad':'HomeTeam'})
-
-        # Retrieve corresponding team stats from data and rename variables `away_'
-        awayTeamStats = rawdata.loc[rawdata['Squad'] == awayTeam]
-        awayTeamStats = awayTeamStats.drop(columns=['CrdY','CrdR'])
-        awayTeamStats = awayTeamStats.rename(columns={c: 'away_'+ c for c in awayTeamStats.columns if c not in ['Squad']})
-        awayTeamStats = awayTeamStats.rename(columns={'Squad':'AwayTeam'})
-
-        # temporary merge key
-        homeTeamStats['key'] = 1
-        awayTeamStats['key'] = 1
-
-        # merge records together for one match-up record
-        teamStats = pd.merge(homeTeamStats, awayTeamStats, on=['key'])
-        temp = teamStats['AwayTeam']
-        teamStats = teamStats.drop(columns=['AwayTeam'])
-        teamStats.insert(loc=1, column='AwayTeam', value=temp)
-        teamStats = teamStats.drop(columns=['key'])
-
-        return teamStats
-
-    def predict(self, homeTeam, awayTeam):
-        if (homeTeam == awayTeam):
-            return ["ERROR", "NULL"]
+        groupLayout = QVBoxLayout(self.groupBox)
+        self.historyLabel = QLabel("No prediction history.")
+        groupLayout.addWidget(self.historyLabel)
+
+        self.historyModel = HistoryModel(history)
+        self.historyList = QListView()
+        # Uniform rows let the view lay out and paint only what is on screen
+        self.historyList.setUniformItemSizes(True)
+        self.historyList.setModel(self.historyModel)
+        self.historyList.selectionModel().currentChanged.connect(self._showEntry)
+        groupLayout.addWidget(self.historyList)
+        self.generalLayout.addWidget(self.groupBox)
+        self._updateEmptyLabel()
+
+    def refresh(self):
+        self.historyModel.refresh()
+        self._updateEmptyLabel()
+        self.selectLatest()
+
+    def selectLatest(self):
+        if self.historyModel.rowCount() > 0:
+            self.historyList.setCurrentIndex(self.historyModel.index(0))
+
+    def _updateEmptyLabel(self):
+        self.historyLabel.setVisible(self.historyModel.rowCount() == 0)
+
+    def _showEntry(self, current, previous):
+        entry = self.historyModel.entry(current.row()) if current.isValid() else None
+        # The row can already have rotated out of the in-memory buffer
+        if entry is None:
+            return
+        if self.canvas is None:
+            from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+            from matplotlib.figure import Figure
+            fig = Figure(figsize=(3,3))
+            self.axes = fig.add_subplot()
+            self.canvas = FigureCanvas(fig)
+            self.chartLayout.addWidget(self.canvas)
+        self.axes.cla()
+        self.axes.pie(entry["Proba"][0], labels=OUTCOME_NAMES, autopct='%1.1f%%')
+        self.axes.set_title(f"{entry['HomeTeam']} vs {entry['AwayTeam']}")
+        self.canvas.draw_idle()
+
+class ModelLoader(QObject):
+    ###Builds PredModel off the GUI thread###
+    progress = pyqtSignal(str, int)
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def run(self):
+        try:
+            # Deferred so pandas and sklearn are imported on this thread too
+            from historystore import HistoryStore
+            from predmodel import PredModel
+            predModel = PredModel(progress=self.progress.emit, historyStore=HistoryStore())
+        except Exception as error:
+            self.failed.emit(str(error))
         else:
-            teamstats = self.currentYearData.loc[(self.currentYearData['HomeTeam'] == homeTeam) & 
-                                     (self.currentYearData['AwayTeam'] == awayTeam)]
-            pureData = teamstats.drop(columns=['HomeTeam', 'AwayTeam'])
-            # Predict outcome and probas
-            pred = self.predictingModel.predict(pureData)
-            proba = self.predictingModel.predict_proba(pureData)
-
-            # Add predictions to new dictionary
-            predResult = {'HomeTeam' : homeTeam,
-                          'AwayTeam' : awayTeam,
-                          'Pred' : pred,
-                          'Proba' : proba}
-            
-            self.history.append(predResult)
-
-            return [pred, proba]
+            self.loaded.emit(predModel)
 
 class Controller:
     ###Controller Class###
@@ -327,6 +306,23 @@ class Controller:
         self._view = view
         self.historyWindow = None
         self._connectSignalsAndSlots()
+
+    def loadModelInBackground(self):
+        self._loaderThread = QThread()
+        self._loader = ModelLoader()
+        self._loader.moveToThread(self._loaderThread)
+        self._loaderThread.started.connect(self._loader.run)
+        self._loader.progress.connect(self._view.setLoadingProgress)
+        self._loader.loaded.connect(self.setModel)
+        self._loader.failed.connect(self._view.setLoadingFailed)
+        self._loader.loaded.connect(self._loaderThread.quit)
+        self._loader.failed.connect(self._loaderThread.quit)
+        self._loaderThread.start()
+
+    def setModel(self, model):
+        self._predModel = model
+        self._view.setTeams([str(team) for team in model.currentYearData.teams])
+        self._view.setModelReady()
     
     def _predictResult(self):
         result = self._predModel.predict(
@@ -337,11 +333,23 @@ class Controller:
         self._view.setOutputDisplay(str(result[0]))
         if (str(result[1])!="NULL"):
             self._view.updateOutputGraph(result[1][0])
+        if self.historyWindow is not None and self.historyWindow.isVisible():
+            self.historyWindow.refresh()
+
+    def close(self):
+        # Waits for queued history rows to reach the database
+        if self._predModel is not None and self._predModel.historyStore is not None:
+            self._predModel.historyStore.close()
     
     def _showHistoryWindow(self):
-        # if self.historyWindow is None:
-        self.historyWindow = HistoryWindow(self._predModel.history)
+        # The window is kept and only picks up new entries, so reopening it costs the same however long the session
+        history = self._predModel.history if self._predModel is not None else []
+        if self.historyWindow is None or self.historyWindow.history is not history:
+            self.historyWindow = HistoryWindow(history)
+        else:
+            self.historyWindow.refresh()
         self.historyWindow.show()
+        self.historyWindow.raise_()
 
     def _connectSignalsAndSlots(self):
         self._view.outputButton.clicked.connect(partial(self._predictResult))
@@ -350,11 +358,13 @@ class Controller:
 
 def main():
     ###Main function for app###
-    predModel = PredModel()
     app = QApplication([])
     appWindow = AppWindow()
     appWindow.show()
-    Controller(model=predModel, view=appWindow)
+    # Data and model load on a worker thread while the window is already usable
+    controller = Controller(model=None, view=appWindow)
+    controller.loadModelInBackground()
+    app.aboutToQuit.connect(controller.close)
     sys.exit(app.exec())
 
 ### Entry point ###
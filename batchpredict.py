@@ -0,0 +1,123 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import pandas as pd
+from competitions import COMPETITIONS, DEFAULT_COMPETITION, getCompetition
+from predmodel import CURRENT_SEASON, DEFAULT_MODEL_PATH, OUTCOME_LABELS, PredModel
+
+OUTPUT_COLUMNS = ['Season', 'HomeTeam', 'AwayTeam', 'Pred', 'Result'] + [label.replace(' ', '') for label in OUTCOME_LABELS]
+
+def statsPathFor(season, dataDir='./data'):
+    # '2017-18' -> data/2017-2018_teamstats.csv, the current season -> data/currentyeardata.csv
+    start = int(season[:4])
+    path = os.path.join(dataDir, f'{start}-{start + 1}_teamstats.csv')
+    if os.path.exists(path):
+        return path
+    if season == CURRENT_SEASON:
+        return os.path.join(dataDir, 'currentyeardata.csv')
+    return None
+
+class CsvWriter:
+    ###Streams prediction chunks as CSV rows###
+    def __init__(self, stream):
+        self.writer = csv.writer(stream)
+        self.writer.writerow(OUTPUT_COLUMNS)
+
+    def writeChunk(self, chunk):
+        self.writer.writerows(chunk.itertuples(index=False, name=None))
+
+class JsonLinesWriter:
+    ###Streams prediction chunks as one JSON object per line###
+    def __init__(self, stream):
+        self.stream = stream
+
+    def writeChunk(self, chunk):
+        for record in chunk.to_dict(orient='records'):
+            self.stream.write(json.dumps(record) + '\n')
+
+WRITERS = {'csv': CsvWriter, 'jsonl': JsonLinesWriter}
+
+def predictFixtures(predModel, fixtures, writer, chunkSize=5000, registry=None, ensembleNames=None, teamNames=None):
+    # Fixtures must all be from the season currently loaded into predModel
+    teams = set(predModel.currentYearData.teams)
+    teamNames = predModel.competition.teamNames() if teamNames is None else teamNames
+    home = fixtures['HomeTeam'].replace(teamNames)
+    away = fixtures['AwayTeam'].replace(teamNames)
+    known = home.isin(teams) & away.isin(teams) & (home != away)
+
+    fixtures, home, away = fixtures[known], home[known], away[known]
+    for start in range(0, len(fixtures), chunkSize):
+        chunk = fixtures.iloc[start:start + chunkSize]
+        homeTeams, awayTeams = home.iloc[start:start + chunkSize], away.iloc[start:start + chunkSize]
+        if registry is not None:
+            pred, proba = predModel.predictEnsemble(homeTeams, awayTeams, registry, ensembleNames)
+        else:
+            pred, proba = predModel.predictBatch(homeTeams, awayTeams)
+        output = pd.DataFrame({'Season': chunk['Season'].to_numpy(),
+                               'HomeTeam': chunk['HomeTeam'].to_numpy(),
+                               'AwayTeam': chunk['AwayTeam'].to_numpy(),
+                               'Pred': pred,
+                               'Result': [OUTCOME_LABELS[p] for p in pred]})
+        for i, column in enumerate(OUTPUT_COLUMNS[5:]):
+            output[column] = proba[:, i]
+        writer.writeChunk(output)
+
+    return int((~known).sum())
+
+def run(fixturesPath, output, outputFormat, modelPath=None, dataRoot='./data',
+        chunkSize=5000, encoding='cp1252', ensemble=None, competition=DEFAULT_COMPETITION):
+    competition = getCompetition(competition)
+    dataDir = competition.dataDir(dataRoot)
+    teamNames = competition.teamNames(dataRoot)
+    modelPath = modelPath or os.path.join(competition.modelsDir(), os.path.basename(DEFAULT_MODEL_PATH))
+    fixtures = pd.read_csv(fixturesPath, usecols=['Season', 'HomeTeam', 'AwayTeam'], encoding=encoding)
+    writer = WRITERS[outputFormat](output)
+    registry, ensembleNames = None, None
+    if ensemble is not None:
+        # 'all' averages every compatible non-Keras model, otherwise a comma-separated list of names
+        from modelregistry import ModelRegistry
+        registry = ModelRegistry(os.path.dirname(modelPath) or '.')
+        ensembleNames = None if ensemble == 'all' else ensemble.split(',')
+
+    # Load the model once and swap team stats per season
+    predModel = None
+    for season, seasonFixtures in fixtures.groupby('Season', sort=False):
+        path = statsPathFor(season, dataDir)
+        if path is None:
+            print(f"{season}: no team stats, skipped {len(seasonFixtures)} fixtures", file=sys.stderr)
+            continue
+        rawdata = pd.read_csv(path, index_col=0)
+        if predModel is None:
+            predModel = PredModel(modelPath=modelPath, rawdata=rawdata, competition=competition.key)
+        else:
+            predModel.reloadData(rawdata)
+
+        skipped = predictFixtures(predModel, seasonFixtures, writer, chunkSize, registry, ensembleNames, teamNames)
+        if skipped:
+            print(f"{season}: skipped {skipped} fixtures with unknown teams", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predict outcomes for a fixture CSV (Season, HomeTeam, AwayTeam) without the GUI.")
+    parser.add_argument('fixtures', help="fixture CSV, e.g. data/results.csv")
+    parser.add_argument('-o', '--output', default='-', help="output file, '-' for stdout")
+    parser.add_argument('-f', '--format', choices=sorted(WRITERS), help="output format, guessed from the output extension by default")
+    parser.add_argument('--competition', default=DEFAULT_COMPETITION, help=f"from {', '.join(COMPETITIONS)}")
+    parser.add_argument('-m', '--model', help="saved model to predict with, by default the competition's randomtree model")
+    parser.add_argument('--data-dir', default='./data', help="data root; competitions other than the Premier League read <data-dir>/<competition>")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="fixtures scored per model call")
+    parser.add_argument('--encoding', default='cp1252', help="fixture CSV encoding")
+    parser.add_argument('--ensemble', help="average models from the model's directory: 'all' or comma-separated names")
+    args = parser.parse_args(argv)
+
+    outputFormat = args.format or ('jsonl' if args.output.endswith(('.jsonl', '.json')) else 'csv')
+    if args.output == '-':
+        run(args.fixtures, sys.stdout, outputFormat, args.model, args.data_dir, args.chunk_size, args.encoding, args.ensemble, args.competition)
+    else:
+        with open(args.output, 'w', newline='', encoding='utf-8') as output:
+            run(args.fixtures, output, outputFormat, args.model, args.data_dir, args.chunk_size, args.encoding, args.ensemble, args.competition)
+
+### Entry point ###
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from competitions import COMPETITIONS, DEFAULT_COMPETITION, getCompetition
+
+FIXTURES_DIR = './benchmarks/fixtures'
+THRESHOLDS_PATH = './benchmarks/thresholds.json'
+STATS_PATH = './data/currentyeardata.csv'
+MODELS_DIR = './models'
+DEFAULT_RATIO = 1.25
+DEFAULT_NOISE = 0.001
+
+def measure(fn, repeat=7, number=None, minTime=0.05):
+    # Seconds per call over `repeat` timed runs; by default each run loops until it lasts minTime,
+    # so sub-millisecond calls are not dominated by timer and scheduler noise
+    if number is None:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - start >= minTime:
+                break
+            number *= 2
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    q1, q3 = np.percentile(times, [25, 75])
+    return {'median': float(np.median(times)), 'min': float(np.min(times)), 'max': float(np.max(times)),
+            'iqr': float(q3 - q1), 'repeat': repeat, 'number': number}
+
+def benchPredModel(repeat):
+    from predmodel import PredModel
+    rawdata = pd.read_csv(STATS_PATH, index_col=0)
+    results = {}
+
+    # Cold construction pays for the imports and the model load in a fresh interpreter
+    script = ('import pandas as pd; from predmodel import PredModel; '
+              f'PredModel(rawdata=pd.read_csv({STATS_PATH!r}, index_col=0))')
+    results['predmodel_cold'] = measure(lambda: subprocess.run([sys.executable, '-c', script], check=True,
+                                                               stderr=subprocess.DEVNULL), max(3, repeat // 2), 1)
+    results['predmodel_warm'] = measure(lambda: PredModel(rawdata=rawdata), repeat)
+
+    predModel = PredModel(rawdata=rawdata)
+    matchesData = predModel.storeData(rawdata)
+    results['store_data'] = measure(lambda: predModel.storeData(rawdata), repeat)
+    results['scale_data'] = measure(lambda: predModel.scaleData(matchesData), repeat)
+
+    teams = predModel.currentYearData.teams
+    results['predict_single'] = measure(lambda: predModel.predict(teams[0], teams[1]), repeat)
+    homeTeams, awayTeams = predModel.currentYearData.homeTeams, predModel.currentYearData.awayTeams
+    results['predict_batch_all'] = measure(lambda: predModel.predictBatch(homeTeams, awayTeams), repeat)
+    return results
+
+def benchModelLoads(repeat):
+    import joblib
+    results = {}
+    for path in sorted(glob.glob(os.path.join(MODELS_DIR, '*.sav'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        results[f'joblib_load_{name}'] = measure(lambda: joblib.load(path), repeat)
+    return results
+
+def benchScraping(repeat):
+    # Parse and clean saved fbref pages; run `benchmark.py record` once to save them
+    from scrapecache import readSelectedTables
+    from scraping import CLEANERS, MERGED_TABLES, TABLES, mergeTables
+    pages = sorted(glob.glob(os.path.join(FIXTURES_DIR, 'html', '*.html')))
+    if not pages:
+        # A missing fixture must not pass the gate silently; leave 'scraping' out of the suites to skip it
+        raise FileNotFoundError(f"no HTML fixtures in {FIXTURES_DIR}/html, run 'benchmark.py record'")
+
+    htmls = []
+    for path in pages:
+        with open(path, encoding='utf-8') as f:
+            htmls.append(f.read())
+    indices = [TABLES[name] for name in MERGED_TABLES]
+    parsed = [readSelectedTables(html, indices) for html in htmls]
+
+    def clean():
+        for tables in parsed:
+            mergeTables([CLEANERS[name](table, 38) for name, table in zip(MERGED_TABLES, tables)])
+
+    return {'parse_tables': measure(lambda: [readSelectedTables(html, indices) for html in htmls], repeat),
+            'clean_and_merge': measure(clean, repeat)}
+
+def benchFullData(repeat):
+    # The results.csv preprocessing from webscraper.py and the store join that produces fulldata.csv
+    from featurestore import FeatureStore, buildFromCsv, readResults
+    teamNames = getCompetition(DEFAULT_COMPETITION).teamNames()
+    files = {}
+    for path in sorted(glob.glob('./data/*_teamstats.csv')):
+        start = os.path.basename(path)[:4]
+        files[f'{start}-{str(int(start) + 1)[2:]}'] = path
+
+    def prepareResults():
+        results = readResults('./data/results.csv', teamNames)
+        return results[results['Season'].isin(list(files))]
+
+    with tempfile.TemporaryDirectory() as storeDir:
+        store = FeatureStore(storeDir)
+        results = {'prepare_results': measure(prepareResults, repeat),
+                   'build_store': measure(lambda: buildFromCsv(store, files, teamNames=teamNames), repeat),
+                   'match_features': measure(store.matchFeatures, repeat)}
+    return results
+
+SUITES = {'predmodel': benchPredModel, 'models': benchModelLoads, 'scraping': benchScraping, 'fulldata': benchFullData}
+
+def compare(results, baseline, thresholds):
+    # A benchmark regresses when it is consistently slower than the baseline, or its median exceeds an absolute maxSeconds limit
+    ratios = thresholds.get('ratio', {})
+    limits = thresholds.get('maxSeconds', {})
+    noise = thresholds.get('noiseSeconds', DEFAULT_NOISE)
+    failures = []
+    for name, result in results.items():
+        median = result['median']
+        if name in baseline:
+            ratio = ratios.get(name, ratios.get('default', DEFAULT_RATIO))
+            base = baseline[name]
+            result['baselineMedian'] = base['median']
+            result['ratio'] = median / base['median']
+            # The fastest run now must be slower than the slowest baseline run by the ratio and by more than
+            # the timer noise floor, so run-to-run jitter on a busy machine does not fail the gate
+            slowest = base.get('max', base['median'])
+            if result['min'] > slowest * ratio and result['min'] - slowest > noise:
+                failures.append(f"{name}: {median * 1000:.2f}ms is {result['ratio']:.2f}x the baseline median, fastest run "
+                                f"{result['min'] * 1000:.2f}ms vs slowest baseline {slowest * 1000:.2f}ms (limit {ratio}x)")
+        if name in limits and median > limits[name]:
+            failures.append(f"{name}: {median * 1000:.2f}ms exceeds {limits[name] * 1000:.2f}ms")
+    return failures
+
+def run(suites, repeat, baselinePath=None, thresholdsPath=THRESHOLDS_PATH):
+    results = {}
+    for suite in suites:
+        results.update(SUITES[suite](repeat))
+
+    baseline = {}
+    if baselinePath:
+        with open(baselinePath) as f:
+            baseline = json.load(f)['results']
+    thresholds = {}
+    if thresholdsPath and os.path.exists(thresholdsPath):
+        with open(thresholdsPath) as f:
+            thresholds = json.load(f)
+
+    failures = compare(results, baseline, thresholds)
+    report = {'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                       'python': platform.python_version(), 'platform': platform.platform(),
+                       'numpy': np.__version__, 'pandas': pd.__version__, 'suites': suites, 'baseline': baselinePath},
+              'results': results,
+              'failures': failures}
+    return report
+
+# Column layout of each squad table on an fbref season page, as (header group, column); '' groups parse as 'Unnamed: n_level_0'
+PAGE_TABLES = {
+    'standard': [('', 'Squad'), ('', '# Pl'), ('', 'Age'), ('', 'Poss'), ('Playing Time', 'MP')]
+                + [('Performance', c) for c in ['Gls', 'Ast', 'G+A', 'G-PK', 'PK', 'PKatt', 'CrdY', 'CrdR']]
+                + [('Expected', 'xG'), ('Progression', 'PrgC'), ('Progression', 'PrgP'), ('Per 90 Minutes', 'Gls')],
+    'goalkeeping': [('', 'Squad'), ('', '# Pl'), ('Performance', 'GA'), ('Performance', 'Saves')],
+    'shooting': [('', 'Squad'), ('', '# Pl'), ('', '90s'), ('Standard', 'Sh'), ('Standard', 'SoT'), ('Expected', 'xG')],
+    'passtypes': [('', 'Squad'), ('', '# Pl'), ('', '90s'), ('', 'Att')]
+                 + [('Pass Types', c) for c in ['Live', 'FK', 'TB', 'Sw', 'Crs', 'TI', 'CK']]
+                 + [('Corner Kicks', 'In'), ('Outcomes', 'Cmp')],
+    'defensive': [('', 'Squad'), ('', '# Pl'), ('', '90s')]
+                 + [('Tackles', c) for c in ['Tkl', 'TklW', 'Def 3rd', 'Mid 3rd', 'Att 3rd']]
+                 + [('Challenges', c) for c in ['Tkl', 'Att', 'Tkl%', 'Lost']]
+                 + [('Blocks', c) for c in ['Blocks', 'Sh', 'Pass']]
+                 + [('', 'Int'), ('', 'Tkl+Int'), ('', 'Clr'), ('', 'Err')],
+    'possession': [('', 'Squad'), ('', '# Pl'), ('', 'Poss'), ('', '90s'), ('Touches', 'Touches'), ('Take-Ons', 'Att'),
+                   ('Carries', 'Carries'), ('Receiving', 'Rec')],
+    'misc': [('', 'Squad'), ('', '# Pl'), ('', '90s')]
+            + [('Performance', c) for c in ['CrdY', 'CrdR', 'Fls', 'Fld', 'Off', 'Crs', 'Int', 'TklW', 'PKwon', 'PKcon', 'OG', 'Recov']]
+            + [('Aerial Duels', 'Won')],
+}
+
+def synthesizeSeasonPage(teamStats, gamesPlayed=38):
+    # An fbref-shaped page built from a *_teamstats.csv, so the scraping suite runs in a fresh checkout;
+    # stats are scaled back to season totals, columns the cleaners drop are zero
+    from scraping import TABLES
+    squads = teamStats['Squad'].tolist()
+    positions = {index: name for name, index in TABLES.items()}
+    html = ['<html><body>']
+    for index in range(max(TABLES.values()) + 1):
+        if index == 0:
+            table = pd.DataFrame({'Rk': range(1, len(squads) + 1), 'Squad': squads, 'MP': gamesPlayed})
+        elif positions.get(index) in PAGE_TABLES:
+            columns = PAGE_TABLES[positions[index]]
+            table = pd.DataFrame(0.0, index=range(len(squads)), columns=pd.MultiIndex.from_tuples(columns))
+            for position, (group, column) in enumerate(columns):
+                if column == 'Squad':
+                    table.isetitem(position, squads)
+                elif column == 'Poss':
+                    table.isetitem(position, teamStats['Poss'].to_numpy())
+                elif column in teamStats and table.columns.get_level_values(1).tolist().index(column) == position:
+                    table.isetitem(position, teamStats[column].to_numpy() * gamesPlayed)
+        else:
+            # Opponent and other tables the scraper skips, kept so table positions match the real page
+            table = pd.DataFrame({'Squad': ['vs ' + squad for squad in squads], 'MP': gamesPlayed})
+        html.append(table.to_html(index=False))
+    html.append('</body></html>')
+    return '\n'.join(html)
+
+def record(years, cache=None, competition=DEFAULT_COMPETITION):
+    # Saves the fbref season pages as HTML fixtures, going through the scrape cache
+    from scrapecache import ScrapeCache
+    competition = getCompetition(competition)
+    cache = cache or ScrapeCache()
+    os.makedirs(os.path.join(FIXTURES_DIR, 'html'), exist_ok=True)
+    for year in years:
+        html, _ = cache.fetchHtml(competition.seasonURL(year))
+        path = os.path.join(FIXTURES_DIR, 'html', f'{year}-{competition.fbrefName}-Stats.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        print(f"Saved {path}", file=sys.stderr)
+
+def recordSynthetic(years, dataRoot='./data', competition=DEFAULT_COMPETITION):
+    competition = getCompetition(competition)
+    os.makedirs(os.path.join(FIXTURES_DIR, 'html'), exist_ok=True)
+    for year in years:
+        teamStats = pd.read_csv(os.path.join(competition.dataDir(dataRoot), f'{year}_teamstats.csv'), index_col=0)
+        path = os.path.join(FIXTURES_DIR, 'html', f'{year}-{competition.fbrefName}-Stats.synthetic.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(synthesizeSeasonPage(teamStats, competition.gamesPerSeason))
+        print(f"Saved {path}", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the prediction, model loading, scraping and feature building hot paths.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    runParser = subparsers.add_parser('run', help="run the benchmarks and print a JSON report")
+    runParser.add_argument('suites', nargs='*', default=list(SUITES), help=f"suites to run, from {', '.join(SUITES)}")
+    runParser.add_argument('--repeat', type=int, default=7, help="timed runs per benchmark")
+    runParser.add_argument('-o', '--output', help="write the JSON report here instead of stdout")
+    runParser.add_argument('--baseline', help="earlier JSON report to compare against")
+    runParser.add_argument('--thresholds', default=THRESHOLDS_PATH, help="JSON file of allowed ratios and absolute limits")
+    recordParser = subparsers.add_parser('record', help="save fbref pages as offline HTML fixtures")
+    recordParser.add_argument('years', nargs='*', default=['2021-2022'])
+    recordParser.add_argument('--synthetic', action='store_true', help="build the pages from data/*_teamstats.csv instead of fetching them")
+    recordParser.add_argument('--competition', default=DEFAULT_COMPETITION, help=f"from {', '.join(COMPETITIONS)}")
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        if args.synthetic:
+            recordSynthetic(args.years, competition=args.competition)
+        else:
+            record(args.years, competition=args.competition)
+        return
+
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+    report = run(args.suites, args.repeat, args.baseline, args.thresholds)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    for failure in report['failures']:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    sys.exit(1 if report['failures'] else 0)
+
+### Entry point ###
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import csv
+import os
+
+DEFAULT_COMPETITION = 'premier-league'
+
+class Competition:
+    ###fbref identifiers and local paths for one league###
+    def __init__(self, key, fbrefId, fbrefName, gamesPerSeason, teamNames=None):
+        self.key = key
+        self.fbrefId = fbrefId
+        self.fbrefName = fbrefName
+        self.gamesPerSeason = gamesPerSeason
+        self.builtinTeamNames = teamNames or {}
+
+    def seasonURL(self, year):
+        # year is fbref's '2021-2022' form
+        return f'https://fbref.com/en/comps/{self.fbrefId}/{year}/{year}-{self.fbrefName}-Stats'
+
+    def dataDir(self, root='./data'):
+        # The Premier League keeps the original flat layout under data/
+        return root if self.key == DEFAULT_COMPETITION else os.path.join(root, self.key)
+
+    def resultsPath(self, root='./data'):
+        return os.path.join(self.dataDir(root), 'results.csv')
+
+    def currentStatsPath(self, root='./data'):
+        return os.path.join(self.dataDir(root), 'currentyeardata.csv')
+
+    def teamNames(self, root='./data'):
+        # Results-file name -> fbref squad name; data/<competition>/teamnames.csv (ResultsName,FbrefName) adds to the built-in table
+        names = dict(self.builtinTeamNames)
+        path = os.path.join(self.dataDir(root), 'teamnames.csv')
+        if os.path.exists(path):
+            with open(path, newline='', encoding='utf-8') as f:
+                names.update((row['ResultsName'], row['FbrefName']) for row in csv.DictReader(f))
+        return names
+
+    def modelsDir(self, root='./models'):
+        return root if self.key == DEFAULT_COMPETITION else os.path.join(root, self.key)
+
+    def storeDir(self, root='./data/store'):
+        return os.path.join(root, f'competition={self.key}')
+
+# results.csv team names that differ from fbref's squad names
+RESULTS_TEAM_NAMES = {'Cardiff':'Cardiff City', 'Leeds':'Leeds United', 'Leicester':'Leicester City', 'Man City':'Manchester City',
+                      'Man United':'Manchester Utd','Newcastle':'Newcastle Utd', 'Norwich':'Norwich City', "Nott'm Forest":"Nott'ham Forest", 'Sheffield United':'Sheffield Utd',
+                      'Stoke':'Stoke City','Swansea':'Swansea City'}
+
+COMPETITIONS = {competition.key: competition for competition in [
+    Competition('premier-league', 9, 'Premier-League', 38, RESULTS_TEAM_NAMES),
+    Competition('championship', 10, 'Championship', 46),
+    Competition('la-liga', 12, 'La-Liga', 38),
+    Competition('serie-a', 11, 'Serie-A', 38),
+    Competition('bundesliga', 20, 'Bundesliga', 34),
+    Competition('ligue-1', 13, 'Ligue-1', 38),
+]}
+
+def fbrefSeason(season):
+    # '2022-23' -> '2022-2023'
+    start = int(season[:4])
+    return f'{start}-{start + 1}'
+
+def shortSeason(year):
+    # '2022-2023' -> '2022-23', as in results.csv
+    return f'{year[:4]}-{year[-2:]}'
+
+def getCompetition(key):
+    if key not in COMPETITIONS:
+        raise KeyError(f"unknown competition {key!r}, expected one of {', '.join(COMPETITIONS)}")
+    return COMPETITIONS[key]
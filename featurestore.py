@@ -0,0 +1,173 @@
+import glob
+import json
+import os
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+
+DEFAULT_STORE_DIR = './data/store'
+TEAMSTATS = 'teamstats'
+MATCHES = 'matches'
+
+class FeatureStore:
+    ###Typed columnar tables partitioned by season, one memory-mappable .npy per column###
+    # Layout: <root>/<table>/season=<season>/part-<n>/<column>.npy plus schema.json.
+    # Parts are immutable, so appending a season or gameweek only ever adds a directory.
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def seasons(self, table):
+        partitions = glob.glob(os.path.join(self.root, table, 'season=*'))
+        return sorted(os.path.basename(path)[len('season='):] for path in partitions)
+
+    def columns(self, table):
+        parts = self._parts(table, self.seasons(table))
+        if not parts:
+            return []
+        return list(_readSchema(parts[0]))
+
+    def append(self, table, season, frame):
+        # Writes frame as a new part of the season's partition
+        partition = os.path.join(self.root, table, f'season={season}')
+        os.makedirs(partition, exist_ok=True)
+        tmpDir = os.path.join(partition, f'.tmp-{os.getpid()}-{threading.get_ident()}')
+        shutil.rmtree(tmpDir, ignore_errors=True)
+        os.makedirs(tmpDir)
+
+        schema = {}
+        for column in frame.columns:
+            values = frame[column].infer_objects()
+            if not pd.api.types.is_numeric_dtype(values.dtype):
+                # Strings are dictionary-encoded as int32 codes, with -1 for missing values
+                categorical = pd.Categorical(values)
+                np.save(os.path.join(tmpDir, column + '.npy'), categorical.codes.astype(np.int32))
+                schema[column] = {'kind': 'category', 'categories': [str(c) for c in categorical.categories]}
+            else:
+                np.save(os.path.join(tmpDir, column + '.npy'), values.to_numpy())
+                schema[column] = {'kind': 'numeric', 'dtype': str(values.dtype)}
+        with open(os.path.join(tmpDir, 'schema.json'), 'w') as f:
+            json.dump(schema, f)
+
+        # Part numbers only grow, so a concurrent reader sees either the old or the new set of parts
+        existing = [int(os.path.basename(path)[len('part-'):]) for path in glob.glob(os.path.join(partition, 'part-*'))]
+        os.replace(tmpDir, os.path.join(partition, f'part-{max(existing, default=-1) + 1:05d}'))
+
+    def replaceSeason(self, table, season, frame):
+        # For re-scraped season aggregates, which supersede rather than extend the old rows
+        partition = os.path.join(self.root, table, f'season={season}')
+        staleParts = glob.glob(os.path.join(partition, 'part-*'))
+        self.append(table, season, frame)
+        newest = max(glob.glob(os.path.join(partition, 'part-*')))
+        for part in staleParts:
+            if part != newest:
+                shutil.rmtree(part, ignore_errors=True)
+
+    def readArrays(self, table, columns=None, seasons=None, mmap=True):
+        # Only the requested columns of the requested seasons are opened
+        parts = self._parts(table, seasons or self.seasons(table))
+        arrays = {}
+        partSeasons = []
+        for part in parts:
+            schema = _readSchema(part)
+            names = columns or list(schema)
+            for name in names:
+                if name == 'Season':
+                    continue
+                values = np.load(os.path.join(part, name + '.npy'), mmap_mode='r' if mmap else None)
+                if schema[name]['kind'] == 'category':
+                    # The trailing None is what code -1 (missing) indexes
+                    values = np.asarray(schema[name]['categories'] + [None], dtype=object)[values]
+                arrays.setdefault(name, []).append(values)
+            partSeasons.append(np.full(_partLength(part, schema), _partSeason(part), dtype=object))
+
+        result = {name: chunks[0] if len(chunks) == 1 else np.concatenate(chunks) for name, chunks in arrays.items()}
+        if columns is None or 'Season' in columns:
+            result['Season'] = np.concatenate(partSeasons) if partSeasons else np.array([], dtype=object)
+        return result
+
+    def read(self, table, columns=None, seasons=None):
+        arrays = self.readArrays(table, columns, seasons)
+        order = columns or (['Season'] + [c for c in arrays if c != 'Season'])
+        return pd.DataFrame({name: arrays[name] for name in order})
+
+    def matchFeatures(self, seasons=None, statColumns=None):
+        # The fulldata.csv layout, joined at read time with one index gather per side
+        seasons = seasons or self.seasons(MATCHES)
+        matches = self.read(MATCHES, ['Season', 'HomeTeam', 'AwayTeam', 'FTR'], seasons)
+        teamStats = self.read(TEAMSTATS, None if statColumns is None else ['Season', 'Squad'] + statColumns, seasons)
+        stats = teamStats.drop(columns=['Season', 'Squad'])
+
+        keys = pd.MultiIndex.from_arrays([teamStats['Season'], teamStats['Squad']])
+        home = keys.get_indexer(pd.MultiIndex.from_arrays([matches['Season'], matches['HomeTeam']]))
+        away = keys.get_indexer(pd.MultiIndex.from_arrays([matches['Season'], matches['AwayTeam']]))
+        values = np.vstack([stats.to_numpy(dtype=np.float64), np.full((1, stats.shape[1]), np.nan)])
+
+        # Teams without stats get NaN, as the old left merge did
+        homeStats = pd.DataFrame(values[home], columns=['home_' + c for c in stats.columns])
+        awayStats = pd.DataFrame(values[away], columns=['away_' + c for c in stats.columns])
+        return pd.concat([matches.reset_index(drop=True), homeStats, awayStats], axis=1)
+
+    def _parts(self, table, seasons):
+        parts = []
+        for season in seasons:
+            parts.extend(sorted(glob.glob(os.path.join(self.root, table, f'season={season}', 'part-*'))))
+        return parts
+
+def _readSchema(part):
+    with open(os.path.join(part, 'schema.json')) as f:
+        return json.load(f)
+
+def _partSeason(part):
+    return os.path.basename(os.path.dirname(part))[len('season='):]
+
+def _partLength(part, schema):
+    first = next(iter(schema))
+    return len(np.load(os.path.join(part, first + '.npy'), mmap_mode='r'))
+
+def readResults(resultsPath='./data/results.csv', teamNames=None):
+    # Match results in the data/results.csv layout, FTR coded 0/1/2 and team names mapped to fbref's
+    results = pd.read_csv(resultsPath, encoding='cp1252', usecols=['Season', 'HomeTeam', 'AwayTeam', 'FTR'])
+    results['FTR'] = results['FTR'].map({'H':0, 'D':1, 'A':2})
+    if teamNames:
+        results[['HomeTeam', 'AwayTeam']] = results[['HomeTeam', 'AwayTeam']].replace(teamNames)
+    return results
+
+def buildFromCsv(store, teamStatsFiles, resultsPath='./data/results.csv', teamNames=None):
+    # One-off import of the existing *_teamstats.csv files and results.csv; teamStatsFiles maps short season -> path
+    for season, path in teamStatsFiles.items():
+        store.replaceSeason(TEAMSTATS, season, pd.read_csv(path, index_col=0))
+
+    results = readResults(resultsPath, teamNames)
+    for season, matches in results[results['Season'].isin(list(teamStatsFiles))].groupby('Season'):
+        store.replaceSeason(MATCHES, season, matches.drop(columns=['Season']).reset_index(drop=True))
+
+def main(argv=None):
+    import argparse
+    from competitions import COMPETITIONS, DEFAULT_COMPETITION, getCompetition
+    parser = argparse.ArgumentParser(description="Build or export the season-partitioned feature store.")
+    parser.add_argument('command', choices=['build', 'export-csv', 'info'])
+    parser.add_argument('--competition', default=DEFAULT_COMPETITION, help=f"from {', '.join(COMPETITIONS)}")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="store root; each competition has its own partition")
+    parser.add_argument('--data-dir', default='./data')
+    parser.add_argument('--output', help="CSV written by export-csv, default the competition's fulldata.csv")
+    args = parser.parse_args(argv)
+
+    competition = getCompetition(args.competition)
+    dataDir = competition.dataDir(args.data_dir)
+    store = FeatureStore(competition.storeDir(args.store))
+    if args.command == 'build':
+        files = {}
+        for path in sorted(glob.glob(os.path.join(dataDir, '*_teamstats.csv'))):
+            start = os.path.basename(path)[:4]
+            files[f'{start}-{str(int(start) + 1)[2:]}'] = path
+        buildFromCsv(store, files, competition.resultsPath(args.data_dir), competition.teamNames(args.data_dir))
+    elif args.command == 'export-csv':
+        # For the notebook, which still reads fulldata.csv
+        store.matchFeatures().to_csv(args.output or os.path.join(dataDir, 'fulldata.csv'))
+    for table in (TEAMSTATS, MATCHES):
+        print(f"{table}: seasons {', '.join(store.seasons(table))}")
+
+### Entry point ###
+if __name__ == "__main__":
+    main()
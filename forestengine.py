@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import numpy as np
+
+ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+
+def exportForest(forest, outDir):
+    # Concatenate every tree's nodes; children become absolute node indices, leaves have left == -1
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        isLeaf = tree.children_left == -1
+        roots.append(offset)
+        features.append(np.where(isLeaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        lefts.append(np.where(isLeaf, -1, tree.children_left + offset))
+        rights.append(np.where(isLeaf, -1, tree.children_right + offset))
+        # Leaf values are stored as class probabilities, as DecisionTreeClassifier.predict_proba returns them
+        value = tree.value[:, 0, :]
+        total = value.sum(axis=1, keepdims=True)
+        values.append(value / np.where(total == 0, 1, total))
+        offset += tree.node_count
+
+    arrays = {'feature': np.concatenate(features).astype(np.int32),
+              'threshold': np.concatenate(thresholds).astype(np.float64),
+              'left': np.concatenate(lefts).astype(np.int32),
+              'right': np.concatenate(rights).astype(np.int32),
+              'value': np.concatenate(values).astype(np.float64),
+              'roots': np.array(roots, dtype=np.int32)}
+    meta = {'classes': np.asarray(forest.classes_).tolist(), 'nFeatures': int(forest.n_features_in_),
+            'nTrees': len(roots), 'nNodes': offset}
+
+    # Written beside the target and swapped in whole, so readers never see a half-written forest
+    tmpDir = outDir.rstrip('/\\') + '.tmp'
+    shutil.rmtree(tmpDir, ignore_errors=True)
+    os.makedirs(tmpDir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmpDir, name + '.npy'), array)
+    with open(os.path.join(tmpDir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(outDir, ignore_errors=True)
+    os.replace(tmpDir, outDir)
+
+def isForestDir(path):
+    return os.path.isfile(os.path.join(path, 'meta.json')) and os.path.isfile(os.path.join(path, 'roots.npy'))
+
+class ForestEngine:
+    ###Vectorized random forest inference over flat, memory-mapped node arrays###
+    def __init__(self, arrays, meta):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = np.asarray(arrays['roots'])
+        self.classes_ = np.array(meta['classes'])
+        self.n_features_in_ = meta['nFeatures']
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        # mmap shares the node arrays between processes through the page cache
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mode) for name in ARRAYS}
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(arrays, meta)
+
+    def apply(self, features):
+        # Walk every (row, tree) pair one level per step, dropping pairs once they reach a leaf
+        features = np.asarray(features, dtype=np.float32)
+        nFeatures = features.shape[1]
+        flatFeatures = features.ravel()
+        nTrees = len(self.roots)
+        nodes = np.tile(self.roots, len(features))
+        rowOffsets = np.repeat(np.arange(len(features)) * nFeatures, nTrees)
+        active = np.flatnonzero(self.left[nodes] != -1)
+        while active.size:
+            current = nodes[active]
+            # sklearn compares float32 inputs against float64 thresholds, so do the same
+            goLeft = flatFeatures[rowOffsets[active] + self.feature[current]] <= self.threshold[current]
+            nextNodes = np.where(goLeft, self.left[current], self.right[current])
+            nodes[active] = nextNodes
+            active = active[self.left[nextNodes] != -1]
+        return nodes.reshape(len(features), nTrees)
+
+    def predict_proba(self, features, chunkSize=4096):
+        features = np.asarray(features)
+        probas = np.empty((len(features), len(self.classes_)))
+        for start in range(0, len(features), chunkSize):
+            leaves = self.apply(features[start:start + chunkSize])
+            probas[start:start + chunkSize] = self.value[leaves].mean(axis=1)
+        return probas
+
+    def predict(self, features):
+        return self.classes_[self.predict_proba(features).argmax(axis=1)]
+
+def main(argv=None):
+    import argparse
+    import joblib
+    parser = argparse.ArgumentParser(description="Export a pickled random forest to memory-mappable arrays.")
+    parser.add_argument('model', help="pickled RandomForestClassifier, e.g. models/randomtree.sav")
+    parser.add_argument('output', help="directory to write, e.g. models/randomtree.forest")
+    parser.add_argument('--check', type=int, default=1000, help="random rows to compare against predict_proba, 0 to skip")
+    args = parser.parse_args(argv)
+
+    forest = joblib.load(args.model)
+    exportForest(forest, args.output)
+    print(f"Exported {len(forest.estimators_)} trees to {args.output}")
+
+    if args.check:
+        sample = np.random.default_rng(0).normal(size=(args.check, forest.n_features_in_))
+        difference = np.abs(ForestEngine.load(args.output).predict_proba(sample) - forest.predict_proba(sample)).max()
+        print(f"Max difference from predict_proba over {args.check} rows: {difference:.3g}")
+
+### Entry point ###
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import closing
+import numpy as np
+
+DEFAULT_HISTORY_PATH = './data/history.sqlite'
+RECENT_SIZE = 500
+PENDING_SIZE = 10000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS teams (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    season TEXT,
+    home INTEGER NOT NULL REFERENCES teams(id),
+    away INTEGER NOT NULL REFERENCES teams(id),
+    pred INTEGER NOT NULL,
+    pHome REAL NOT NULL,
+    pDraw REAL NOT NULL,
+    pAway REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS predictionsTime ON predictions (time);
+CREATE INDEX IF NOT EXISTS predictionsHome ON predictions (home, time);
+CREATE INDEX IF NOT EXISTS predictionsAway ON predictions (away, time);
+CREATE INDEX IF NOT EXISTS predictionsSeason ON predictions (season, time);
+'''
+
+class RecentHistory(deque):
+    ###Ring buffer of the newest history entries that also counts everything ever appended###
+    def __init__(self, maxlen=RECENT_SIZE):
+        super().__init__(maxlen=maxlen)
+        self.appended = 0
+
+    def append(self, entry):
+        super().append(entry)
+        self.appended += 1
+
+class HistoryStore:
+    ###Prediction history in SQLite, written in batches by a background thread###
+    def __init__(self, path=DEFAULT_HISTORY_PATH, recentSize=RECENT_SIZE, flushSize=200, flushInterval=1.0, pendingSize=PENDING_SIZE):
+        self.path = path
+        self.recent = RecentHistory(recentSize)
+        self.flushSize = flushSize
+        self.flushInterval = flushInterval
+        # Bounded so a stalled writer cannot grow memory; entries recorded while it is full are dropped
+        self.pending = queue.Queue(maxsize=pendingSize)
+        self.dropped = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(SCHEMA)
+        self.writer = threading.Thread(target=self._writeLoop, name='HistoryStore', daemon=True)
+        self.writer.start()
+
+    def record(self, entry, season=None):
+        # Called from predict: only a queue put, the disk write happens on the writer thread
+        entry = dict(entry, Season=season, Time=entry.get('Time', time.time()))
+        self.recent.append(entry)
+        try:
+            self.pending.put_nowait(entry)
+        except queue.Full:
+            if not self.dropped:
+                print(f"HistoryStore: writer is {self.pending.maxsize} predictions behind, dropping new ones", file=sys.stderr)
+            self.dropped += 1
+
+    def flush(self):
+        # Blocks until everything recorded so far has been written, or failed to write
+        if not self.writer.is_alive():
+            return
+        done = threading.Event()
+        self.pending.put(done)
+        done.wait()
+
+    def close(self):
+        if self.writer.is_alive():
+            self.pending.put(None)
+            self.writer.join()
+
+    def query(self, team=None, season=None, since=None, until=None, limit=None):
+        # Newest first; team matches either side, since/until are Unix times
+        clauses, params = [], []
+        with closing(self._connect()) as connection:
+            if team is not None:
+                # Filtering on the team id rather than the joined names lets SQLite use the home/away indexes
+                row = connection.execute('SELECT id FROM teams WHERE name = ?', (str(team),)).fetchone()
+                clauses.append('(p.home = ? OR p.away = ?)')
+                params += [row[0] if row else None] * 2
+            if season is not None:
+                clauses.append('p.season = ?')
+                params.append(season)
+            if since is not None:
+                clauses.append('p.time >= ?')
+                params.append(since)
+            if until is not None:
+                clauses.append('p.time < ?')
+                params.append(until)
+            sql = ('SELECT p.time, p.season, h.name, a.name, p.pred, p.pHome, p.pDraw, p.pAway FROM predictions p '
+                   'JOIN teams h ON h.id = p.home JOIN teams a ON a.id = p.away')
+            if clauses:
+                sql += ' WHERE ' + ' AND '.join(clauses)
+            sql += ' ORDER BY p.time DESC'
+            if limit is not None:
+                sql += f' LIMIT {int(limit)}'
+
+            import pandas as pd
+            return pd.read_sql_query(sql, connection, params=params).set_axis(
+                ['Time', 'Season', 'HomeTeam', 'AwayTeam', 'Pred', 'HomeWin', 'Draw', 'AwayWin'], axis=1)
+
+    def count(self):
+        with closing(self._connect()) as connection:
+            return connection.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        # WAL lets queries read while the writer thread commits
+        connection.execute('PRAGMA journal_mode=WAL')
+        return connection
+
+    def _writeLoop(self):
+        connection = self._connect()
+        teamIds = {}
+        running = True
+        while running:
+            batch, waiters = [], []
+            item = self.pending.get()
+            deadline = time.monotonic() + self.flushInterval
+            # Collect until the batch is full, the interval passes, or a flush/close arrives
+            while True:
+                if item is None:
+                    running = False
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.flushSize:
+                    break
+                try:
+                    item = self.pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            # A failed batch is logged and dropped; the thread has to survive it or flush() would never return
+            try:
+                if batch:
+                    self._writeBatch(batch, teamIds, connection)
+            except Exception as error:
+                print(f"HistoryStore: could not write {len(batch)} predictions: {error!r}", file=sys.stderr)
+                # Ids cached during the rolled back transaction may not exist
+                teamIds.clear()
+            finally:
+                for waiter in waiters:
+                    waiter.set()
+        connection.close()
+
+    def _writeBatch(self, batch, teamIds, connection):
+        values = []
+        for entry in batch:
+            try:
+                values.append(self._values(entry))
+            except (KeyError, IndexError, TypeError, ValueError) as error:
+                print(f"HistoryStore: skipped a prediction that cannot be stored: {error!r}", file=sys.stderr)
+        if not values:
+            return
+        with connection:
+            rows = [(entry['Time'], entry['Season'], self._teamId(entry['HomeTeam'], teamIds, connection),
+                     self._teamId(entry['AwayTeam'], teamIds, connection), pred, *proba)
+                    for entry, pred, proba in values]
+            connection.executemany('INSERT INTO predictions (time, season, home, away, pred, pHome, pDraw, pAway) '
+                                   'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def _values(self, entry):
+        proba = np.asarray(entry['Proba'], dtype=np.float64).ravel()
+        if len(proba) != 3:
+            raise ValueError(f"expected 3 outcome probabilities, got {len(proba)}")
+        return entry, int(np.asarray(entry['Pred']).ravel()[0]), [float(p) for p in proba]
+
+    def _teamId(self, name, teamIds, connection):
+        name = str(name)
+        if name not in teamIds:
+            connection.execute('INSERT OR IGNORE INTO teams (name) VALUES (?)', (name,))
+            teamIds[name] = connection.execute('SELECT id FROM teams WHERE name = ?', (name,)).fetchone()[0]
+        return teamIds[name]
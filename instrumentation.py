@@ -0,0 +1,190 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+# Opt-in through the environment, like the FBREF_* scrape cache settings:
+#   PREDICT_METRICS         JSON lines file for per-stage events and a final summary ('-' for stderr)
+#   PREDICT_METRICS_MEMORY  set to 1 to also record peak Python heap per stage (tracemalloc, slower);
+#                           the heap is process-wide, so stages that overlap another thread's stage report null
+#   PREDICT_PROFILE         write a cProfile trace of the run to this file: the configuring thread throughout,
+#                           plus every stage run on another thread (QThread loaders, scrape workers)
+_recorder = None
+_disabled = nullcontext()
+
+class Recorder:
+    ###Aggregates wall time, call counts and peak memory per named stage###
+    def __init__(self, metricsPath=None, memory=False, profilePath=None):
+        self.metricsPath = metricsPath
+        self.memory = memory
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stream = None
+        if metricsPath == '-':
+            self.stream = sys.stderr
+        elif metricsPath:
+            os.makedirs(os.path.dirname(os.path.abspath(metricsPath)), exist_ok=True)
+            self.stream = open(metricsPath, 'a', encoding='utf-8')
+        if memory:
+            import tracemalloc
+            tracemalloc.start()
+        # Thread id -> open stage count, and a counter bumped whenever a stage opens while another thread has one open
+        self.activeStages = {}
+        self.overlaps = 0
+        self.profiler = None
+        # cProfile only traces the thread that enables it, so other threads get a profiler per outermost stage
+        self.threadProfiles = []
+        self.profileThread = threading.get_ident()
+        if profilePath:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.profilePath = profilePath
+        self.closed = False
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def record(self, name, seconds, peakBytes, **fields):
+        with self.lock:
+            total = self.totals.setdefault(name, {'calls': 0, 'seconds': 0.0, 'maxSeconds': 0.0, 'peakBytes': None})
+            total['calls'] += 1
+            total['seconds'] += seconds
+            total['maxSeconds'] = max(total['maxSeconds'], seconds)
+            if peakBytes is not None:
+                total['peakBytes'] = max(total['peakBytes'] or 0, peakBytes)
+            self._write({'event': 'stage', 'stage': name, 'seconds': seconds, 'peakBytes': peakBytes,
+                         'thread': threading.current_thread().name, 'time': time.time(), **fields})
+
+    def summary(self):
+        with self.lock:
+            return {name: dict(total) for name, total in self.totals.items()}
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.profiler is not None:
+            import pstats
+            self.profiler.disable()
+            stats = pstats.Stats(self.profiler)
+            with self.lock:
+                for profile in self.threadProfiles:
+                    stats.add(profile)
+            stats.dump_stats(self.profilePath)
+        with self.lock:
+            self._write({'event': 'summary', 'time': time.time(), 'stages': self.totals})
+            if self.stream is not None and self.stream is not sys.stderr:
+                self.stream.close()
+            self.stream = None
+
+    def _write(self, event):
+        if self.stream is not None:
+            self.stream.write(json.dumps(event) + '\n')
+            self.stream.flush()
+
+class _Stage:
+    # Nested stages each report the peak reached while they ran, including their children's,
+    # unless a stage on another thread overlapped them
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        recorder = self.recorder
+        thread = threading.get_ident()
+        with recorder.lock:
+            depth = recorder.activeStages.get(thread, 0)
+            self.concurrent = any(count for other, count in recorder.activeStages.items() if other != thread)
+            if self.concurrent:
+                recorder.overlaps += 1
+            self.overlaps = recorder.overlaps
+            recorder.activeStages[thread] = depth + 1
+
+        self.profile = None
+        if recorder.profiler is not None and depth == 0 and thread != recorder.profileThread:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+        if recorder.memory:
+            import tracemalloc
+            stack = recorder.local.__dict__.setdefault('stack', [])
+            if stack:
+                stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+            # Resetting is process-wide, so it is skipped while other threads are measuring
+            if not self.concurrent:
+                tracemalloc.reset_peak()
+            stack.append([tracemalloc.get_traced_memory()[0], 0])
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        recorder = self.recorder
+        with recorder.lock:
+            thread = threading.get_ident()
+            recorder.activeStages[thread] -= 1
+            if not recorder.activeStages[thread]:
+                del recorder.activeStages[thread]
+            concurrent = self.concurrent or recorder.overlaps != self.overlaps
+
+        if self.profile is not None:
+            self.profile.disable()
+            with recorder.lock:
+                recorder.threadProfiles.append(self.profile)
+
+        peakBytes = None
+        if recorder.memory:
+            import tracemalloc
+            stack = recorder.local.stack
+            startBytes, childPeak = stack.pop()
+            peak = max(childPeak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            if not concurrent:
+                tracemalloc.reset_peak()
+                peakBytes = peak - startBytes
+        recorder.record(self.name, seconds, peakBytes, failed=exc[0] is not None)
+        return False
+
+def configure(metricsPath=None, memory=False, profilePath=None):
+    # Enables recording for the rest of the process; the summary and profile are written at exit
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+    _recorder = Recorder(metricsPath, memory, profilePath)
+    atexit.register(_recorder.close)
+    return _recorder
+
+def enabled():
+    return _recorder is not None
+
+def stage(name):
+    # A shared no-op context when disabled, so the cost is one global lookup
+    if _recorder is None:
+        return _disabled
+    return _recorder.stage(name)
+
+def timed(name):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return fn(*args, **kwargs)
+            with _recorder.stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def summary():
+    return _recorder.summary() if _recorder is not None else {}
+
+if os.environ.get('PREDICT_METRICS') or os.environ.get('PREDICT_PROFILE'):
+    configure(os.environ.get('PREDICT_METRICS'), os.environ.get('PREDICT_METRICS_MEMORY', '') not in ('', '0'),
+              os.environ.get('PREDICT_PROFILE'))
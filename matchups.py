@@ -0,0 +1,60 @@
+import numpy as np
+
+class MatchupMatrix:
+    ###Feature rows for every home/away pairing of a team stats table###
+    def __init__(self, teams, features, columns):
+        self.teams = teams
+        self.features = features
+        self.columns = columns
+        self.teamIndex = {team: i for i, team in enumerate(teams)}
+
+        # Rows are ordered home-major, skipping the diagonal
+        home, away = np.nonzero(~np.eye(len(teams), dtype=bool))
+        self.homeTeams = teams[home]
+        self.awayTeams = teams[away]
+
+    def __len__(self):
+        return len(self.features)
+
+    def rowFor(self, homeTeam, awayTeam):
+        # Position of the (home, away) row without scanning the matrix
+        home = self.teamIndex[homeTeam]
+        away = self.teamIndex[awayTeam]
+        if home == away:
+            raise KeyError((homeTeam, awayTeam))
+        return home * (len(self.teams) - 1) + (away if away < home else away - 1)
+
+    def rowsFor(self, homeTeams, awayTeams):
+        # Vectorized rowFor over whole fixture lists
+        import pandas as pd
+        teams = pd.Index(self.teams)
+        home = teams.get_indexer(homeTeams)
+        away = teams.get_indexer(awayTeams)
+        invalid = (home < 0) | (away < 0) | (home == away)
+        if invalid.any():
+            i = int(np.argmax(invalid))
+            raise KeyError((list(homeTeams)[i], list(awayTeams)[i]))
+        return home * (len(self.teams) - 1) + away - (away > home)
+
+    def withFeatures(self, features):
+        return MatchupMatrix(self.teams, features, self.columns)
+
+    def toFrame(self):
+        import pandas as pd
+        frame = pd.DataFrame(self.features, columns=self.columns)
+        frame.insert(0, 'AwayTeam', self.awayTeams)
+        frame.insert(0, 'HomeTeam', self.homeTeams)
+        return frame
+
+def buildMatchupMatrix(rawdata, dropColumns=('CrdY', 'CrdR')):
+    # One gather per side instead of a filter/merge/concat per pairing
+    stats = rawdata.drop(columns=list(dropColumns))
+    teams = stats['Squad'].to_numpy()
+    stats = stats.drop(columns=['Squad'])
+    values = stats.to_numpy(dtype=np.float64)
+
+    home, away = np.nonzero(~np.eye(len(teams), dtype=bool))
+    features = np.concatenate((values[home], values[away]), axis=1)
+    columns = ['home_' + c for c in stats.columns] + ['away_' + c for c in stats.columns]
+
+    return MatchupMatrix(teams, features, columns)
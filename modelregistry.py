@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import numpy as np
+
+DEFAULT_MODELS_DIR = './models'
+
+def residentBytes():
+    # Current RSS on Linux, peak RSS elsewhere; good enough to attribute a load's cost
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+class KerasClassifier:
+    ###predict_proba/classes_ view of a Keras SavedModel###
+    def __init__(self, model):
+        self.model = model
+        self.classes_ = np.arange(model.output_shape[-1])
+        self.n_features_in_ = model.input_shape[-1]
+
+    def predict_proba(self, features):
+        return np.asarray(self.model.predict(features, verbose=0))
+
+    def predict(self, features):
+        return self.classes_[self.predict_proba(features).argmax(axis=1)]
+
+class ModelEntry:
+    ###A model artefact on disk, loaded the first time it is used###
+    def __init__(self, name, path, kind):
+        self.name = name
+        self.path = path
+        self.kind = kind
+        self.model = None
+        self.loadSeconds = None
+        self.memoryBytes = None
+        # Input width and predict_proba support, remembered after the first load so they can be checked unloaded
+        self.nFeatures = None
+        self.hasProba = None
+
+    def get(self):
+        if self.model is None:
+            before = residentBytes()
+            start = time.perf_counter()
+            self.model = self._load()
+            self.loadSeconds = time.perf_counter() - start
+            self.memoryBytes = max(residentBytes() - before, 0)
+            self.nFeatures = getattr(self.model, 'n_features_in_', None)
+            self.hasProba = hasattr(self.model, 'predict_proba')
+        return self.model
+
+    def _load(self):
+        if self.kind == 'forest':
+            from forestengine import ForestEngine
+            return ForestEngine.load(self.path)
+        if self.kind == 'keras':
+            # TensorFlow is only imported when a Keras model is actually used
+            import tensorflow as tf
+            return KerasClassifier(tf.keras.models.load_model(self.path))
+        import joblib
+        return joblib.load(self.path)
+
+    def unload(self):
+        self.model = None
+        self.memoryBytes = None
+
+    def stats(self):
+        return {'name': self.name, 'kind': self.kind, 'path': self.path, 'loaded': self.model is not None,
+                'loadSeconds': self.loadSeconds, 'memoryBytes': self.memoryBytes}
+
+def discoverModels(modelsDir=DEFAULT_MODELS_DIR):
+    # *.sav files are joblib pickles, *.forest directories are exported forests and
+    # directories holding saved_model.pb are Keras models
+    from forestengine import isForestDir
+    entries = {}
+    for filename in sorted(os.listdir(modelsDir)):
+        path = os.path.join(modelsDir, filename)
+        name, extension = os.path.splitext(filename)
+        if extension == '.sav':
+            entries[name] = ModelEntry(name, path, 'sklearn')
+        elif extension == '.forest' and isForestDir(path):
+            entries[filename] = ModelEntry(filename, path, 'forest')
+        elif os.path.isfile(os.path.join(path, 'saved_model.pb')):
+            entries[filename] = ModelEntry(filename, path, 'keras')
+    return entries
+
+class ModelRegistry:
+    ###Lazily loaded models with batched ensemble scoring###
+    def __init__(self, modelsDir=DEFAULT_MODELS_DIR):
+        self.entries = discoverModels(modelsDir)
+        self.stacker = None
+        self.stackedNames = None
+
+    def names(self):
+        return list(self.entries)
+
+    def get(self, name):
+        return self._entry(name).get()
+
+    def stats(self):
+        return [entry.stats() for entry in self.entries.values()]
+
+    def defaultNames(self, nFeatures):
+        # Keras models join an ensemble only when named, so TensorFlow is never imported by default.
+        # A pickle with an exported .forest copy is the same model, so only the faster copy is used.
+        return [name for name, entry in self.entries.items()
+                if entry.kind != 'keras' and name + '.forest' not in self.entries
+                and self.compatible(name, nFeatures)]
+
+    def compatible(self, name, nFeatures):
+        # supportvector.sav was fit on 10 PCA components and without probabilities, so it cannot join.
+        # A model loaded only to be checked is unloaded again when rejected
+        entry = self._entry(name)
+        wasLoaded = entry.model is not None
+        if entry.hasProba is None:
+            entry.get()
+        accepted = entry.nFeatures in (None, nFeatures) and entry.hasProba
+        if not accepted and not wasLoaded:
+            entry.unload()
+        return accepted
+
+    def predictProba(self, features, names):
+        # One batched call per model over every row, stacked as (model, row, class)
+        probas = []
+        for name in names:
+            if not self.compatible(name, features.shape[1]):
+                raise ValueError(f"model {name!r} does not accept {features.shape[1]} features with predict_proba")
+            probas.append(np.asarray(self.get(name).predict_proba(features), dtype=np.float64))
+        return np.stack(probas)
+
+    def ensemble(self, features, names=None, method='mean', weights=None):
+        if method == 'stack':
+            if self.stacker is None:
+                raise RuntimeError("call fitStacker before using method='stack'")
+            probas = self.predictProba(features, self.stackedNames)
+            return self.stacker.predict_proba(_stackFeatures(probas))
+
+        names = names or self.defaultNames(features.shape[1])
+        probas = self.predictProba(features, names)
+        if method == 'mean':
+            return np.average(probas, axis=0, weights=weights)
+        raise ValueError(f"unknown ensemble method {method!r}")
+
+    def ensembleMatchups(self, matchups, names=None, method='mean', weights=None):
+        # Scores a whole MatchupMatrix in one pass; rows follow matchups.rowFor
+        return self.ensemble(matchups.features, names, method, weights)
+
+    def fitStacker(self, features, labels, names=None):
+        # Logistic regression over the base models' probabilities
+        from sklearn.linear_model import LogisticRegression
+        names = names or self.defaultNames(features.shape[1])
+        probas = self.predictProba(features, names)
+        self.stacker = LogisticRegression(max_iter=1000).fit(_stackFeatures(probas), labels)
+        self.stackedNames = names
+        return self.stacker
+
+    def _entry(self, name):
+        if name not in self.entries:
+            raise KeyError(f"no model named {name!r}, found {', '.join(self.entries)}")
+        return self.entries[name]
+
+def _stackFeatures(probas):
+    return probas.transpose(1, 0, 2).reshape(probas.shape[1], -1)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="List the saved models and what they cost to load.")
+    parser.add_argument('--models-dir', default=DEFAULT_MODELS_DIR)
+    parser.add_argument('--load', nargs='*', default=[], help="models to load before reporting")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.models_dir)
+    for name in args.load:
+        registry.get(name)
+    for stats in registry.stats():
+        print(stats)
+
+### Entry point ###
+if __name__ == "__main__":
+    main()
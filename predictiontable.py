@@ -0,0 +1,63 @@
+import hashlib
+import os
+import numpy as np
+
+class PredictionTable:
+    ###Probabilities for every pairing of a matchup matrix, scored in one batch###
+    def __init__(self, cacheDir='./cache/predictions'):
+        self.cacheDir = cacheDir
+        self.key = None
+        self.probas = None
+        self.classes = None
+        self._matchups = None
+        self._dataKey = None
+
+    def ensure(self, matchups, model, modelPath):
+        # Rebuild only when the team stats or the model file have changed
+        if matchups is not self._matchups:
+            self._matchups = matchups
+            self._dataKey = dataFingerprint(matchups)
+        key = hashlib.sha256((self._dataKey + modelFingerprint(modelPath)).encode()).hexdigest()
+        if key == self.key:
+            return
+
+        if not self._load(key):
+            self.probas = model.predict_proba(matchups.features)
+            self.classes = np.asarray(model.classes_)
+            self._save(key)
+        self.key = key
+
+    def lookup(self, row):
+        proba = self.probas[row:row + 1]
+        pred = self.classes[proba.argmax(axis=1)]
+        return [pred, proba]
+
+    def _path(self, key):
+        return os.path.join(self.cacheDir, key + '.npz')
+
+    def _load(self, key):
+        if self.cacheDir is None or not os.path.exists(self._path(key)):
+            return False
+        with np.load(self._path(key)) as cached:
+            self.probas = cached['probas']
+            self.classes = cached['classes']
+        return True
+
+    def _save(self, key):
+        if self.cacheDir is None:
+            return
+        os.makedirs(self.cacheDir, exist_ok=True)
+        # Write then rename so a crash never leaves a truncated table behind
+        tmpPath = self._path(key) + '.tmp.npz'
+        np.savez(tmpPath, probas=self.probas, classes=self.classes)
+        os.replace(tmpPath, self._path(key))
+
+def dataFingerprint(matchups):
+    digest = hashlib.sha256()
+    digest.update('\0'.join(map(str, matchups.teams)).encode())
+    digest.update(np.ascontiguousarray(matchups.features).tobytes())
+    return digest.hexdigest()
+
+def modelFingerprint(modelPath):
+    stat = os.stat(modelPath)
+    return f'{os.path.abspath(modelPath)}:{stat.st_size}:{stat.st_mtime_ns}'
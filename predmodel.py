@@ -0,0 +1,163 @@
+import os
+import sys
+import joblib
+from sklearn.preprocessing import StandardScaler
+from competitions import DEFAULT_COMPETITION, fbrefSeason, getCompetition
+from forestengine import ForestEngine, isForestDir
+from historystore import RecentHistory
+from instrumentation import stage, timed
+from matchups import buildMatchupMatrix
+from predictiontable import PredictionTable, modelFingerprint
+from scraping import scrapeSeason
+
+DEFAULT_MODEL_PATH = './models/randomtree.sav'
+CURRENT_SEASON = '2022-23'
+OUTCOME_LABELS = ["Home Win", "Draw", "Away Win"]
+
+class PredModel:
+    ###Model###
+    @timed('predmodel.init')
+    def __init__(self, precompute=False, modelPath=None, rawdata=None, progress=None,
+                 historyStore=None, season=CURRENT_SEASON, competition=DEFAULT_COMPETITION):
+        # progress(stage, percent) is called as each loading stage starts
+        self.progress = progress or (lambda stage, percent: None)
+        self.season = season
+        # Each competition has its own team stats, matchup index and, by default, its own model under models/<competition>
+        self.competition = getCompetition(competition)
+        if modelPath is None:
+            modelPath = os.path.join(self.competition.modelsDir(), os.path.basename(DEFAULT_MODEL_PATH))
+        self.reloadData(rawdata)
+        print("Data Loaded", file=sys.stderr)
+
+        self.progress("Loading model", 70)
+        self.modelPath = modelPath
+        self.loadModel()
+        # self.predictingModel = joblib.load('project\models\\logisticreg.sav')
+        print("Model loaded", file=sys.stderr)
+
+        # Optional table of every current-season matchup, scored up front
+        self.predictionTable = None
+        if precompute:
+            self.progress("Scoring all matchups", 90)
+            self.predictionTable = PredictionTable()
+            with stage('predmodel.precompute'):
+                self.predictionTable.ensure(self.currentYearData, self.predictingModel, self.modelPath)
+
+        # Newest predictions in memory; a HistoryStore also persists every one of them
+        self.historyStore = historyStore
+        self.history = historyStore.recent if historyStore is not None else RecentHistory()
+        self.progress("Ready", 100)
+
+    @timed('predmodel.reloadData')
+    def reloadData(self, rawdata=None):
+        # Team stats default to the live current season; pass a frame to use another season
+        if rawdata is None:
+            self.progress("Retrieving team stats", 0)
+            rawdata = self.retrieveData()
+        self.progress("Building matchups", 40)
+        matchesData = self.storeData(rawdata)
+        self.progress("Scaling matchups", 55)
+        self.currentYearData = self.scaleData(matchesData)
+
+    @timed('predmodel.loadModel')
+    def loadModel(self):
+        # A directory written by forestengine.py is mapped in directly instead of unpickled
+        if isForestDir(self.modelPath):
+            self.predictingModel = ForestEngine.load(self.modelPath)
+        else:
+            self.predictingModel = joblib.load(self.modelPath)
+        self.loadedModel = modelFingerprint(self.modelPath)
+
+    def refreshModel(self):
+        # Pick up a retrained .sav without restarting the app
+        if modelFingerprint(self.modelPath) != self.loadedModel:
+            self.loadModel()
+
+    @timed('predmodel.retrieveData')
+    def retrieveData(self) :
+        # Get from data source, normalising by the average number of games played so far
+        yearURL = self.competition.seasonURL(fbrefSeason(self.season))
+        return scrapeSeason(yearURL)
+
+    @timed('predmodel.storeData')
+    def storeData(self, rawdata):
+        # Build every home/away pairing in one pass
+        return buildMatchupMatrix(rawdata)
+
+    @timed('predmodel.scaleData')
+    def scaleData(self, matchesData):
+        scaler = StandardScaler()
+        scaledMatchstats = scaler.fit_transform(matchesData.features)
+
+        return matchesData.withFeatures(scaledMatchstats)
+
+    @timed('predmodel.predict')
+    def predict(self, homeTeam, awayTeam):
+        if (homeTeam == awayTeam):
+            return ["ERROR", "NULL"]
+        else:
+            self.refreshModel()
+            row = self.currentYearData.rowFor(homeTeam, awayTeam)
+            if self.predictionTable is not None:
+                # Rebuilt here if the stats or model changed, otherwise a lookup
+                self.predictionTable.ensure(self.currentYearData, self.predictingModel, self.modelPath)
+                pred, proba = self.predictionTable.lookup(row)
+            else:
+                pureData = self.currentYearData.features[row:row + 1]
+                # Predict outcome and probas
+                pred = self.predictingModel.predict(pureData)
+                proba = self.predictingModel.predict_proba(pureData)
+
+            # Add predictions to new dictionary
+            predResult = {'HomeTeam' : homeTeam,
+                          'AwayTeam' : awayTeam,
+                          'Pred' : pred,
+                          'Proba' : proba}
+            
+            if self.historyStore is not None:
+                self.historyStore.record(predResult, self.season)
+            else:
+                self.history.append(predResult)
+
+            return [pred, proba]
+
+    @timed('predmodel.predictBatch')
+    def predictBatch(self, homeTeams, awayTeams):
+        # Score many fixtures in one model call; pred is the argmax of proba and nothing is added to history
+        self.refreshModel()
+        rows = self.currentYearData.rowsFor(homeTeams, awayTeams)
+        if self.predictionTable is not None:
+            self.predictionTable.ensure(self.currentYearData, self.predictingModel, self.modelPath)
+            proba = self.predictionTable.probas[rows]
+        else:
+            proba = self.predictingModel.predict_proba(self.currentYearData.features[rows])
+        pred = self.predictingModel.classes_[proba.argmax(axis=1)]
+
+        return [pred, proba]
+
+    @timed('predmodel.predictEnsemble')
+    def predictEnsemble(self, homeTeams, awayTeams, registry, names=None, method='mean'):
+        # Same as predictBatch but with probabilities combined across a ModelRegistry's models
+        rows = self.currentYearData.rowsFor(homeTeams, awayTeams)
+        proba = registry.ensemble(self.currentYearData.features[rows], names, method)
+        pred = proba.argmax(axis=1)
+
+        return [pred, proba]
+
+class CompetitionModels:
+    ###One lazily built PredModel per competition###
+    def __init__(self, **options):
+        # options are passed to every PredModel, e.g. precompute=True
+        self.options = options
+        self.models = {}
+
+    def get(self, competition=DEFAULT_COMPETITION):
+        if competition not in self.models:
+            self.models[competition] = PredModel(competition=competition, **self.options)
+        return self.models[competition]
+
+    def predict(self, competition, homeTeam, awayTeam):
+        return self.get(competition).predict(homeTeam, awayTeam)
+
+    def predictBatch(self, competition, homeTeams, awayTeams):
+        return self.get(competition).predictBatch(homeTeams, awayTeams)
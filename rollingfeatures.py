@@ -0,0 +1,126 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+
+RESULTS_PATH = './data/results.csv'
+# Per-team stats taken from each result, as (for, against) column pairs seen from the home side
+STAT_COLUMNS = {'Goals': ('FTHG', 'FTAG'), 'Shots': ('HS', 'AS'), 'ShotsOnTarget': ('HST', 'AST'), 'Corners': ('HC', 'AC')}
+TEAM_STATS = ['GoalsFor', 'GoalsAgainst', 'ShotsFor', 'ShotsAgainst', 'ShotsOnTargetFor', 'ShotsOnTargetAgainst',
+              'CornersFor', 'CornersAgainst', 'Points', 'Win', 'Draw', 'Loss']
+
+def loadResults(path=RESULTS_PATH):
+    results = pd.read_csv(path, encoding='cp1252', parse_dates=['DateTime'])
+    # Stable sort keeps file order for kick-offs at the same time
+    return results.sort_values('DateTime', kind='stable').reset_index(drop=True)
+
+def teamMatchRows(results):
+    # Two rows per match, one from each team's point of view
+    sides = []
+    for isHome, team, opponent in ((True, 'HomeTeam', 'AwayTeam'), (False, 'AwayTeam', 'HomeTeam')):
+        side = pd.DataFrame({'match': results.index, 'Season': results['Season'], 'DateTime': results['DateTime'],
+                             'Team': results[team], 'Opponent': results[opponent], 'IsHome': isHome})
+        for stat, (homeColumn, awayColumn) in STAT_COLUMNS.items():
+            side[stat + 'For'] = results[homeColumn if isHome else awayColumn].astype(np.float64)
+            side[stat + 'Against'] = results[awayColumn if isHome else homeColumn].astype(np.float64)
+        won = results['FTR'] == ('H' if isHome else 'A')
+        drew = results['FTR'] == 'D'
+        side['Win'] = won.astype(np.float64)
+        side['Draw'] = drew.astype(np.float64)
+        side['Loss'] = (~won & ~drew).astype(np.float64)
+        side['Points'] = 3 * side['Win'] + side['Draw']
+        sides.append(side)
+    return pd.concat(sides).sort_values(['match', 'IsHome'], ascending=[True, False], kind='stable').reset_index(drop=True)
+
+def rollingMeans(rows, keys, window):
+    # Mean of each stat over the previous `window` matches per key, excluding the current one.
+    # Windowed sums come from differences of per-group cumulative sums, so there is no per-row Python.
+    grouped = [rows[k] for k in keys]
+    values = rows[TEAM_STATS]
+    sums = values.fillna(0.0).groupby(grouped).cumsum()
+    counts = values.notna().astype(np.float64).groupby(grouped).cumsum()
+
+    before = sums.groupby(grouped).shift(1).fillna(0.0) - sums.groupby(grouped).shift(window + 1).fillna(0.0)
+    seen = counts.groupby(grouped).shift(1).fillna(0.0) - counts.groupby(grouped).shift(window + 1).fillna(0.0)
+    return before / seen.where(seen > 0)
+
+def computeFormFeatures(results, window=5, resetEachSeason=False):
+    # Pre-match rolling form for every match: overall form and venue form (home form for the home side, away form for the away side)
+    rows = teamMatchRows(results)
+    teamKeys = ['Team', 'Season'] if resetEachSeason else ['Team']
+    overall = rollingMeans(rows, teamKeys, window).add_prefix(f'last{window}_')
+    venue = rollingMeans(rows, teamKeys + ['IsHome'], window).add_prefix(f'venue_last{window}_')
+    form = pd.concat([overall, venue], axis=1)
+
+    home = form[rows['IsHome'].to_numpy()].add_prefix('home_').set_index(rows.loc[rows['IsHome'], 'match'])
+    away = form[~rows['IsHome'].to_numpy()].add_prefix('away_').set_index(rows.loc[~rows['IsHome'], 'match'])
+    return pd.concat([results[['Season', 'DateTime', 'HomeTeam', 'AwayTeam', 'FTR']], home, away], axis=1)
+
+def sideValues(result, isHome):
+    # One result as TEAM_STATS values for one side, without building a frame
+    values = []
+    for homeColumn, awayColumn in STAT_COLUMNS.values():
+        ownColumn, otherColumn = (homeColumn, awayColumn) if isHome else (awayColumn, homeColumn)
+        values += [float(result.get(ownColumn, np.nan)), float(result.get(otherColumn, np.nan))]
+    won = float(result['FTR'] == ('H' if isHome else 'A'))
+    drew = float(result['FTR'] == 'D')
+    return np.array(values + [3 * won + drew, won, drew, 1.0 - won - drew])
+
+class RollingForm:
+    ###Incrementally updated rolling form; each new result costs O(1)###
+    def __init__(self, window=5):
+        self.window = window
+        # (team, scope) -> (recent stat rows, running sums, running non-missing counts)
+        self.state = {}
+
+    @classmethod
+    def fromHistory(cls, results, window=5):
+        # Only the last `window` matches per team and venue are replayed
+        form = cls(window)
+        rows = teamMatchRows(results)
+        for scope, scopeRows in (('all', rows), ('venue', rows)):
+            keys = ['Team'] if scope == 'all' else ['Team', 'IsHome']
+            recent = scopeRows.groupby(keys, sort=False).tail(window)
+            for row in recent.itertuples(index=False):
+                form._push((row.Team, form._scope(scope, row.IsHome)), np.array([getattr(row, s) for s in TEAM_STATS]))
+        return form
+
+    def update(self, homeTeam, awayTeam, result):
+        # result uses results.csv names: FTHG, FTAG, FTR and optionally HS, AS, HST, AST, HC, AC
+        for team, isHome in ((homeTeam, True), (awayTeam, False)):
+            values = sideValues(result, isHome)
+            self._push((team, 'all'), values)
+            self._push((team, self._scope('venue', isHome)), values)
+
+    def features(self, homeTeam, awayTeam):
+        # Same columns as computeFormFeatures for the next meeting of these two teams
+        features = {}
+        for side, team, venue in (('home', homeTeam, 'home'), ('away', awayTeam, 'away')):
+            for prefix, key in ((f'last{self.window}_', (team, 'all')), (f'venue_last{self.window}_', (team, venue))):
+                means = self._means(key)
+                for stat, value in zip(TEAM_STATS, means):
+                    features[f'{side}_{prefix}{stat}'] = value
+        return features
+
+    def _scope(self, scope, isHome):
+        return 'all' if scope == 'all' else ('home' if isHome else 'away')
+
+    def _push(self, key, values):
+        if key not in self.state:
+            self.state[key] = (deque(), np.zeros(len(TEAM_STATS)), np.zeros(len(TEAM_STATS)))
+        recent, sums, counts = self.state[key]
+        present = ~np.isnan(values)
+        recent.append(values)
+        sums += np.where(present, values, 0.0)
+        counts += present
+        if len(recent) > self.window:
+            dropped = recent.popleft()
+            droppedPresent = ~np.isnan(dropped)
+            sums -= np.where(droppedPresent, dropped, 0.0)
+            counts -= droppedPresent
+
+    def _means(self, key):
+        if key not in self.state:
+            return np.full(len(TEAM_STATS), np.nan)
+        _, sums, counts = self.state[key]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
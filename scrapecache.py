@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.request
+from io import StringIO
+from urllib.parse import urlparse
+import pandas as pd
+from instrumentation import stage, timed
+
+# Settings can be overridden per run without touching code:
+#   FBREF_CACHE_DIR  where snapshots live (default ./cache/fbref)
+#   FBREF_CACHE_TTL  seconds before a snapshot is refetched (default one day, -1 never expires)
+#   FBREF_OFFLINE    set to 1 to never make an HTTP request
+#   FBREF_MIRROR     local directory or http:// base URL of saved pages to fetch from instead of fbref
+DEFAULT_CACHE_DIR = './cache/fbref'
+DEFAULT_TTL = 24 * 60 * 60
+USER_AGENT = 'Mozilla/5.0 (predicting-football-matches)'
+
+class ScrapeCacheMiss(LookupError):
+    ###Raised when a page is needed but offline mode forbids fetching it###
+    pass
+
+class ScrapeCache:
+    ###Content-addressed on-disk snapshots of fbref pages and their parsed tables###
+    def __init__(self, cacheDir=None, ttl=None, offline=None, mirror=None):
+        self.cacheDir = cacheDir or os.environ.get('FBREF_CACHE_DIR', DEFAULT_CACHE_DIR)
+        if ttl is None:
+            ttl = float(os.environ.get('FBREF_CACHE_TTL', DEFAULT_TTL))
+        self.ttl = ttl
+        if offline is None:
+            offline = os.environ.get('FBREF_OFFLINE', '') not in ('', '0')
+        self.offline = offline
+        self.mirror = mirror or os.environ.get('FBREF_MIRROR') or None
+
+    def readHtml(self, url, indices=None):
+        # Warm path: URL index -> content hash -> pickled tables, no HTML parsing
+        entry = self._freshEntry(url)
+        if entry is not None:
+            paths = self._tablePaths(entry['sha256'], indices)
+            if all(os.path.exists(path) for path in paths):
+                with stage('scrape.cacheHit'):
+                    return self._readTables(paths, indices)
+
+        html, digest = self.fetchHtml(url)
+        if indices is None:
+            with stage('scrape.parse'):
+                tables = pd.read_html(StringIO(html))
+            self._writeAtomic(self._tablesPath(digest), lambda path: pd.to_pickle(tables, path))
+            return tables
+
+        with stage('scrape.parse'):
+            tables = readSelectedTables(html, indices)
+        for path, table in zip(self._tablePaths(digest, indices), tables):
+            if not os.path.exists(path):
+                self._writeAtomic(path, lambda tmpPath: table.to_pickle(tmpPath))
+        return tables
+
+    def _tablePaths(self, digest, indices):
+        if indices is None:
+            return [self._tablesPath(digest)]
+        return [self._tablesPath(digest, index) for index in indices]
+
+    def _readTables(self, paths, indices):
+        if indices is None:
+            return pd.read_pickle(paths[0])
+        return [pd.read_pickle(path) for path in paths]
+
+    def fetchHtml(self, url):
+        entry = self._freshEntry(url)
+        if entry is not None and os.path.exists(self._htmlPath(entry['sha256'])):
+            with open(self._htmlPath(entry['sha256']), encoding='utf-8') as f:
+                return f.read(), entry['sha256']
+
+        html = self._download(url)
+        digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        self._writeAtomic(self._htmlPath(digest), lambda path: _writeText(path, html))
+        entry = {'url': url, 'sha256': digest, 'fetched': time.time()}
+        self._writeAtomic(self._indexPath(url), lambda path: _writeText(path, json.dumps(entry)))
+        return html, digest
+
+    def _freshEntry(self, url):
+        if not os.path.exists(self._indexPath(url)):
+            return None
+        with open(self._indexPath(url), encoding='utf-8') as f:
+            entry = json.load(f)
+        # Offline runs take whatever snapshot exists, however old
+        expired = self.ttl >= 0 and time.time() - entry['fetched'] > self.ttl
+        if expired and not self.offline:
+            return None
+        return entry
+
+    @timed('scrape.download')
+    def _download(self, url):
+        if self.mirror and '://' not in self.mirror:
+            path = _mirrorPath(self.mirror, url)
+            if path is None:
+                raise ScrapeCacheMiss(f'{url} not found in mirror {self.mirror}')
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+
+        if self.offline:
+            raise ScrapeCacheMiss(f'{url} is not cached and offline mode is enabled')
+        if self.mirror:
+            url = self.mirror.rstrip('/') + urlparse(url).path
+        request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+        with urllib.request.urlopen(request) as response:
+            charset = response.headers.get_content_charset() or 'utf-8'
+            return response.read().decode(charset)
+
+    def _indexPath(self, url):
+        return os.path.join(self.cacheDir, 'index', hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _htmlPath(self, digest):
+        return os.path.join(self.cacheDir, 'html', digest + '.html')
+
+    def _tablesPath(self, digest, index=None):
+        if index is None:
+            return os.path.join(self.cacheDir, 'tables', digest + '.pkl')
+        return os.path.join(self.cacheDir, 'tables', digest, f'{index}.pkl')
+
+    def _writeAtomic(self, path, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmpPath = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        write(tmpPath)
+        os.replace(tmpPath, path)
+
+def readSelectedTables(html, indices):
+    # Same table selection as pd.read_html, but only the requested tables are parsed into frames
+    import lxml.html
+    document = lxml.html.fromstring(html)
+    tables = document.xpath("//table[.//text()[re:test(., '.+')]]",
+                            namespaces={'re': 'http://exslt.org/regular-expressions'})
+    # pd.read_html drops display:none tables before numbering them; hidden cells inside a table are dropped when it is parsed below
+    tables = [table for table in tables if 'display:none' not in table.attrib.get('style', '').replace(' ', '')]
+    selected = []
+    for index in indices:
+        markup = lxml.html.tostring(tables[index], encoding='unicode')
+        selected.append(pd.read_html(StringIO(markup))[0])
+    return selected
+
+def _writeText(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def _mirrorPath(mirror, url):
+    # Saved pages may mirror the URL path or just be named after the last segment
+    urlPath = urlparse(url).path.strip('/')
+    for candidate in (urlPath, os.path.basename(urlPath)):
+        for path in (os.path.join(mirror, candidate), os.path.join(mirror, candidate + '.html')):
+            if os.path.isfile(path):
+                return path
+    return None
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+import pandas as pd
+from instrumentation import stage
+from scrapecache import ScrapeCache
+
+# Positions of the squad stat tables on an fbref season page
+LEAGUE_TABLE = 0
+TABLES = {'standard' : 2, 'goalkeeping' : 4, 'shooting' : 8, 'passtypes' : 12,
+          'creativity' : 14, 'defensive' : 16, 'possession' : 18, 'misc' : 22}
+
+# Tables merged into one team stats row, in column order
+MERGED_TABLES = ['standard', 'goalkeeping', 'shooting', 'passtypes', 'defensive', 'possession', 'misc']
+
+def cleanStandard(table, gamesPlayed):
+    standard = table.drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','Unnamed: 3_level_0','Playing Time','Expected', 'Per 90 Minutes'], axis=1, level=0)
+    standard.columns = standard.columns.droplevel()
+    standard = standard.drop(columns=['G+A','G-PK','PK','PKatt'])
+    return perGame(standard, ['Gls','Ast','CrdY','CrdR','PrgC','PrgP'], gamesPlayed)
+
+def cleanGoalkeeping(table, gamesPlayed):
+    goalkeeping = table.copy()
+    goalkeeping.columns = goalkeeping.columns.droplevel()
+    goalkeeping = goalkeeping[['Squad','Saves']]
+    return perGame(goalkeeping, ['Saves'], gamesPlayed)
+
+def cleanShooting(table, gamesPlayed):
+    shooting = table.drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','Expected'], axis=1, level=0)
+    shooting.columns = shooting.columns.droplevel()
+    shooting = shooting[['Squad','Sh','SoT']]
+    return perGame(shooting, ['Sh','SoT'], gamesPlayed)
+
+def cleanPasstypes(table, gamesPlayed):
+    passtypes = table.drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','Unnamed: 3_level_0','Corner Kicks','Outcomes'], axis=1, level=0)
+    passtypes.columns = passtypes.columns.droplevel()
+    passtypes = passtypes[['Squad','FK','TB','Sw','Crs','CK']]
+    return perGame(passtypes, ['FK','TB','Sw','Crs','CK'], gamesPlayed)
+
+def cleanCreativity(table, gamesPlayed):
+    creativity = table.drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','SCA Types','GCA Types'], axis=1, level=0)
+    creativity.columns = creativity.columns.droplevel()
+    creativity = creativity[['Squad','SCA','GCA']]
+    return perGame(creativity, ['SCA','GCA'], gamesPlayed)
+
+def cleanDefensive(table, gamesPlayed):
+    defensive = table.drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','Challenges','Unnamed: 16_level_0'],axis=1,level=0)
+    defensive.columns = defensive.columns.droplevel()
+    defensive = defensive[['Squad','TklW','Blocks','Int','Clr','Err']]
+    return perGame(defensive, ['TklW','Blocks','Int','Clr','Err'], gamesPlayed)
+
+def cleanPossession(table, gamesPlayed):
+    # Possession is already a percentage, so it is not divided by games played
+    possession = table.drop(
+        columns=['Unnamed: 1_level_0','Unnamed: 3_level_0','Touches','Take-Ons','Carries','Receiving'],axis=1,level=0)
+    possession.columns = possession.columns.droplevel()
+    return possession
+
+def cleanMisc(table, gamesPlayed):
+    misc = table.drop(columns=['Unnamed: 1_level_0','Unnamed: 2_level_0','Aerial Duels'],axis=1,level=0)
+    misc.columns = misc.columns.droplevel()
+    misc = misc[['Squad','Fls','Fld','Off','PKwon','PKcon','Recov']]
+    return perGame(misc, ['Fls','Fld','Off','PKwon','PKcon','Recov'], gamesPlayed)
+
+CLEANERS = {'standard' : cleanStandard, 'goalkeeping' : cleanGoalkeeping, 'shooting' : cleanShooting,
+            'passtypes' : cleanPasstypes, 'creativity' : cleanCreativity, 'defensive' : cleanDefensive,
+            'possession' : cleanPossession, 'misc' : cleanMisc}
+
+def perGame(stats, columns, gamesPlayed):
+    stats = stats.copy()
+    stats[columns] = stats[columns].div(gamesPlayed)
+    return stats
+
+def mergeTables(tables):
+    return reduce(lambda left,right: pd.merge(left,right,on=['Squad'],how='outer'), tables)
+
+def scrapeSeason(url, gamesPlayed=None, cache=None, tables=MERGED_TABLES):
+    # Parse only the tables we use; without gamesPlayed, divide by the league table's average MP
+    cache = cache or ScrapeCache()
+    indices = [TABLES[name] for name in tables]
+    if gamesPlayed is None:
+        indices = [LEAGUE_TABLE] + indices
+    parsed = cache.readHtml(url, indices=indices)
+    if gamesPlayed is None:
+        gamesPlayed = parsed.pop(0).loc[:, 'MP'].mean()
+
+    with stage('scrape.clean'):
+        cleaned = [CLEANERS[name](table, gamesPlayed) for name, table in zip(tables, parsed)]
+    with stage('scrape.merge'):
+        return mergeTables(cleaned)
+
+def scrapeCompetitions(seasonsByCompetition, cache=None, maxWorkers=8):
+    # {Competition: [years]} -> {(competition key, year): team stats}; every league and season shares one pool
+    cache = cache or ScrapeCache()
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        futures = {(competition.key, year): executor.submit(scrapeSeason, competition.seasonURL(year), competition.gamesPerSeason, cache)
+                   for competition, years in seasonsByCompetition.items() for year in years}
+        return {key: future.result() for key, future in futures.items()}
@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+from competitions import COMPETITIONS, DEFAULT_COMPETITION
+from predmodel import OUTCOME_LABELS, PredModel
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+class ServiceStats:
+    ###Request latency, batch size and queue depth counters###
+    def __init__(self, window=10000):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batchedRequests = 0
+        self.maxQueueDepth = 0
+        self.latencies = deque(maxlen=window)
+        self.inferenceTimes = deque(maxlen=window)
+
+    def snapshot(self, queueDepth):
+        latencies = np.array(self.latencies) * 1000
+        inference = np.array(self.inferenceTimes) * 1000
+        return {'uptimeSeconds': time.monotonic() - self.started,
+                'requests': self.requests,
+                'errors': self.errors,
+                'queueDepth': queueDepth,
+                'maxQueueDepth': self.maxQueueDepth,
+                'batches': self.batches,
+                'meanBatchSize': self.batchedRequests / self.batches if self.batches else 0.0,
+                'latencyMs': _percentiles(latencies),
+                'inferenceMs': _percentiles(inference)}
+
+def _percentiles(values):
+    if len(values) == 0:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': p50, 'p95': p95, 'p99': p99, 'max': float(values.max())}
+
+class MicroBatcher:
+    ###Coalesces concurrent single predictions into one predict_proba call###
+    def __init__(self, predModel, executor, stats, maxBatch=64, maxDelay=0.005, workers=1):
+        self.predModel = predModel
+        self.executor = executor
+        self.stats = stats
+        self.maxBatch = maxBatch
+        self.maxDelay = maxDelay
+        self.workers = workers
+        self.queue = asyncio.Queue()
+        self.inFlight = set()
+
+    async def predict(self, homeTeam, awayTeam):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((homeTeam, awayTeam, future))
+        self.stats.maxQueueDepth = max(self.stats.maxQueueDepth, self.queue.qsize())
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        # Up to one batch per worker thread is scored at once; while all are busy, requests keep queueing into the next batch
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            await slots.acquire()
+            batch = [await self.queue.get()]
+            # Wait briefly for more requests to arrive before paying for a model call
+            deadline = loop.time() + self.maxDelay
+            while len(batch) < self.maxBatch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            while len(batch) < self.maxBatch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            task = loop.create_task(self._dispatch(batch, slots))
+            self.inFlight.add(task)
+            task.add_done_callback(self.inFlight.discard)
+
+    async def _dispatch(self, batch, slots):
+        homeTeams = [item[0] for item in batch]
+        awayTeams = [item[1] for item in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self._score, homeTeams, awayTeams)
+        except Exception as error:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        finally:
+            slots.release()
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _score(self, homeTeams, awayTeams):
+        start = time.perf_counter()
+        results = scoreFixtures(self.predModel, homeTeams, awayTeams)
+        self.stats.inferenceTimes.append(time.perf_counter() - start)
+        self.stats.batches += 1
+        self.stats.batchedRequests += len(homeTeams)
+        return results
+
+def scoreFixtures(predModel, homeTeams, awayTeams):
+    pred, proba = predModel.predictBatch(homeTeams, awayTeams)
+    return [{'HomeTeam': home, 'AwayTeam': away, 'Pred': int(p), 'Result': OUTCOME_LABELS[int(p)],
+             'Proba': [float(x) for x in row]}
+            for home, away, p, row in zip(homeTeams, awayTeams, pred, proba)]
+
+class PredictionService:
+    ###Minimal HTTP/1.1 front end for PredModel###
+    def __init__(self, predModel, workers=2, maxBatch=64, maxDelay=0.005):
+        self.predModel = predModel
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.stats = ServiceStats()
+        self.batcher = MicroBatcher(predModel, self.executor, self.stats, maxBatch, maxDelay, workers)
+
+    def checkFixture(self, homeTeam, awayTeam):
+        teams = self.predModel.currentYearData.teamIndex
+        if homeTeam not in teams or awayTeam not in teams:
+            return f"unknown team in {homeTeam!r} v {awayTeam!r}"
+        if homeTeam == awayTeam:
+            return "home and away teams must differ"
+        return None
+
+    async def route(self, method, target, body):
+        url = urlparse(target)
+        if url.path == '/health':
+            return 200, {'status': 'ok'}
+        if url.path == '/stats':
+            return 200, self.stats.snapshot(self.batcher.queue.qsize())
+        if url.path == '/teams':
+            return 200, {'teams': [str(team) for team in self.predModel.currentYearData.teams]}
+
+        if url.path == '/predict':
+            query = parse_qs(url.query)
+            if method != 'GET':
+                return 405, {'error': "use GET /predict?home=...&away=..."}
+            homeTeam = query.get('home', [''])[0]
+            awayTeam = query.get('away', [''])[0]
+            error = self.checkFixture(homeTeam, awayTeam)
+            if error:
+                return 400, {'error': error}
+            return 200, await self.batcher.predict(homeTeam, awayTeam)
+
+        if url.path == '/predict/batch':
+            if method != 'POST':
+                return 405, {'error': "use POST /predict/batch"}
+            try:
+                fixtures = json.loads(body)['fixtures']
+                homeTeams = [fixture['HomeTeam'] for fixture in fixtures]
+                awayTeams = [fixture['AwayTeam'] for fixture in fixtures]
+            except (ValueError, KeyError, TypeError):
+                return 400, {'error': 'expected {"fixtures": [{"HomeTeam": ..., "AwayTeam": ...}, ...]}'}
+            for homeTeam, awayTeam in zip(homeTeams, awayTeams):
+                error = self.checkFixture(homeTeam, awayTeam)
+                if error:
+                    return 400, {'error': error}
+            if not fixtures:
+                return 200, {'predictions': []}
+            # Already a batch, so it skips the micro-batcher and goes straight to a worker
+            loop = asyncio.get_running_loop()
+            predictions = await loop.run_in_executor(self.executor, scoreFixtures, self.predModel, homeTeams, awayTeams)
+            return 200, {'predictions': predictions}
+
+        return 404, {'error': f"no route for {url.path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine.strip():
+                    break
+                method, target, version = requestLine.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                start = time.perf_counter()
+                self.stats.requests += 1
+                try:
+                    status, payload = await self.route(method, target, body)
+                except Exception as error:
+                    status, payload = 500, {'error': str(error)}
+                if status >= 400:
+                    self.stats.errors += 1
+                self.stats.latencies.append(time.perf_counter() - start)
+
+                keepAlive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                data = json.dumps(payload).encode()
+                writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                              f"Content-Type: application/json\r\n"
+                              f"Content-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keepAlive else 'close'}\r\n\r\n").encode() + data)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        batcherTask = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving predictions on http://{host}:{port}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcherTask.cancel()
+            self.executor.shutdown(wait=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve match predictions over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--competition', default=DEFAULT_COMPETITION, help=f"from {', '.join(COMPETITIONS)}")
+    parser.add_argument('-m', '--model', help="saved model to predict with, by default the competition's randomtree model")
+    parser.add_argument('--stats', help="team stats CSV to serve instead of scraping the current season")
+    parser.add_argument('--precompute', action='store_true', help="score every matchup up front")
+    parser.add_argument('--workers', type=int, default=2, help="inference worker threads")
+    parser.add_argument('--max-batch', type=int, default=64, help="largest micro-batch per model call")
+    parser.add_argument('--max-delay-ms', type=float, default=5.0, help="longest wait for a micro-batch to fill")
+    args = parser.parse_args(argv)
+
+    rawdata = pd.read_csv(args.stats, index_col=0) if args.stats else None
+    predModel = PredModel(precompute=args.precompute, modelPath=args.model, rawdata=rawdata, competition=args.competition)
+    service = PredictionService(predModel, args.workers, args.max_batch, args.max_delay_ms / 1000)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+### Entry point ###
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from competitions import COMPETITIONS, DEFAULT_COMPETITION, getCompetition
+from predmodel import PredModel
+
+# Home and away points for each outcome, in OUTCOME_LABELS order (home win, draw, away win)
+HOME_POINTS = np.array([3, 1, 0], dtype=np.int16)
+AWAY_POINTS = np.array([0, 1, 3], dtype=np.int16)
+RESULT_CODES = {'H': 0, 'D': 1, 'A': 2}
+CHUNK_SIMS = 10000
+
+def roundRobin(teams):
+    # Every team plays every other team home and away
+    home, away = np.nonzero(~np.eye(len(teams), dtype=bool))
+    return pd.DataFrame({'HomeTeam': np.asarray(teams)[home], 'AwayTeam': np.asarray(teams)[away]})
+
+def readFixtures(path, teamNames, encoding='cp1252'):
+    # HomeTeam and AwayTeam, plus FTR (H/D/A) for fixtures already played; blank FTR means still to play
+    fixtures = pd.read_csv(path, encoding=encoding)
+    fixtures[['HomeTeam', 'AwayTeam']] = fixtures[['HomeTeam', 'AwayTeam']].replace(teamNames)
+    return fixtures
+
+def simulateChunk(proba, homeIdx, awayIdx, basePoints, nSims, seedSequence):
+    # Draws nSims seasons at once: one uniform per (simulation, fixture) against the cumulative probabilities
+    rng = np.random.default_rng(seedSequence)
+    nTeams = len(basePoints)
+    cumulative = np.cumsum(proba, axis=1)
+    draws = rng.random((nSims, len(proba)))
+    outcomes = (draws >= cumulative[:, 0]).astype(np.int8) + (draws >= cumulative[:, 1])
+
+    points = np.tile(basePoints, (nSims, 1))
+    # Fixture -> team one-hot matrices turn the per-fixture points into league tables with two matmuls
+    homeMap = np.zeros((len(proba), nTeams), dtype=np.int16)
+    homeMap[np.arange(len(proba)), homeIdx] = 1
+    awayMap = np.zeros((len(proba), nTeams), dtype=np.int16)
+    awayMap[np.arange(len(proba)), awayIdx] = 1
+    points += HOME_POINTS[outcomes] @ homeMap + AWAY_POINTS[outcomes] @ awayMap
+
+    # Goal difference is not simulated, so teams level on points are ordered at random
+    order = np.argsort(-(points + rng.random(points.shape) * 0.5), axis=1)
+    positions = np.empty_like(order)
+    positions[np.arange(nSims)[:, None], order] = np.arange(nTeams)
+
+    positionCounts = np.bincount((np.arange(nTeams) * nTeams + positions).ravel(), minlength=nTeams * nTeams)
+    return positionCounts.reshape(nTeams, nTeams), points.sum(axis=0, dtype=np.int64)
+
+class SeasonSimulator:
+    ###Monte Carlo league table from one batch of match probabilities###
+    def __init__(self, predModel, fixtures=None):
+        teams = predModel.currentYearData.teams
+        self.teams = teams
+        fixtures = roundRobin(teams) if fixtures is None else fixtures
+        if 'FTR' not in fixtures:
+            fixtures = fixtures.assign(FTR=np.nan)
+        played = fixtures['FTR'].notna()
+
+        # Points already banked from played fixtures
+        teamIndex = pd.Index(teams)
+        self.basePoints = np.zeros(len(teams), dtype=np.int16)
+        results = fixtures[played]
+        home = teamIndex.get_indexer(results['HomeTeam'])
+        away = teamIndex.get_indexer(results['AwayTeam'])
+        # -1 would silently credit the last team, so unknown names fail like MatchupMatrix.rowsFor
+        invalid = (home < 0) | (away < 0)
+        if invalid.any():
+            i = int(np.argmax(invalid))
+            raise KeyError((results['HomeTeam'].iloc[i], results['AwayTeam'].iloc[i]))
+        outcomes = results['FTR'].map(RESULT_CODES).to_numpy(dtype=np.int64)
+        np.add.at(self.basePoints, home, HOME_POINTS[outcomes])
+        np.add.at(self.basePoints, away, AWAY_POINTS[outcomes])
+
+        # Every remaining fixture is scored in a single model call
+        remaining = fixtures[~played]
+        self.homeIdx = teamIndex.get_indexer(remaining['HomeTeam'])
+        self.awayIdx = teamIndex.get_indexer(remaining['AwayTeam'])
+        _, self.proba = predModel.predictBatch(remaining['HomeTeam'], remaining['AwayTeam'])
+
+    def run(self, nSims=100000, seed=0, workers=1, topPlaces=4, relegationPlaces=3):
+        # Chunks and their seeds depend only on nSims and seed, so results are the same for any worker count
+        sizes = [min(CHUNK_SIMS, nSims - start) for start in range(0, nSims, CHUNK_SIMS)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        args = [(self.proba, self.homeIdx, self.awayIdx, self.basePoints, size, seedSequence)
+                for size, seedSequence in zip(sizes, seeds)]
+        if workers > 1:
+            with ProcessPoolExecutor(workers) as executor:
+                chunks = list(executor.map(simulateChunk, *zip(*args)))
+        else:
+            chunks = [simulateChunk(*chunkArgs) for chunkArgs in args]
+
+        positionCounts = sum(counts for counts, _ in chunks)
+        pointsTotal = sum(total for _, total in chunks)
+        positionProba = positionCounts / nSims
+        nTeams = len(self.teams)
+        table = pd.DataFrame({'Team': self.teams,
+                              'ExpectedPoints': pointsTotal / nSims,
+                              'Title': positionProba[:, 0],
+                              f'Top{topPlaces}': positionProba[:, :topPlaces].sum(axis=1),
+                              'Relegation': positionProba[:, nTeams - relegationPlaces:].sum(axis=1)})
+        return table.sort_values('ExpectedPoints', ascending=False).reset_index(drop=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate the rest of the season and print title, top-four and relegation odds.")
+    parser.add_argument('--competition', default=DEFAULT_COMPETITION, help=f"from {', '.join(COMPETITIONS)}")
+    parser.add_argument('--data-dir', default='./data', help="data root; competitions other than the Premier League read <data-dir>/<competition>")
+    parser.add_argument('--stats', help="team stats CSV for the season, by default the competition's currentyeardata.csv")
+    parser.add_argument('--fixtures', help="fixture CSV with HomeTeam, AwayTeam and optional FTR; defaults to a full double round robin")
+    parser.add_argument('-m', '--model', help="saved model to predict with, by default the competition's randomtree model")
+    parser.add_argument('-n', '--sims', type=int, default=100000, help="seasons to simulate")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help="simulation worker processes")
+    parser.add_argument('-o', '--output', help="write the table to this CSV instead of stdout")
+    args = parser.parse_args(argv)
+
+    competition = getCompetition(args.competition)
+    rawdata = pd.read_csv(args.stats or competition.currentStatsPath(args.data_dir), index_col=0)
+    predModel = PredModel(modelPath=args.model, rawdata=rawdata, competition=competition.key)
+    fixtures = readFixtures(args.fixtures, competition.teamNames(args.data_dir)) if args.fixtures else None
+    table = SeasonSimulator(predModel, fixtures).run(args.sims, args.seed, args.workers)
+    if args.output:
+        table.to_csv(args.output, index=False)
+    else:
+        print(table.to_string(index=False, float_format=lambda x: f'{x:.3f}'))
+
+### Entry point ###
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.decomposition import PCA
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV, RandomizedSearchCV, StratifiedKFold, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+from competitions import COMPETITIONS, DEFAULT_COMPETITION, getCompetition
+from featurestore import FeatureStore
+
+DATA_PATH = './data/fulldata.csv'
+MODELS_DIR = './models'
+CACHE_DIR = './cache/train'
+VERSIONS_DIR = 'versions'
+MODEL_NAMES = ['supportvector', 'logisticreg', 'randomtree', 'ann']
+SKLEARN_VERSION = tuple(int(part) for part in sklearn.__version__.split('.')[:2])
+
+def fileFingerprint(path):
+    if os.path.isdir(path):
+        # Feature store parts are immutable, so their names identify the data
+        return ','.join(sorted(glob.glob(os.path.join(path, '*', 'season=*', 'part-*'))))
+    stat = os.stat(path)
+    return f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'
+
+def prepareData(path, fingerprint, testSize, seed, nFolds):
+    # Same preprocessing as notebook.ipynb; cached by joblib.Memory keyed on the data fingerprint
+    if os.path.isdir(path):
+        data = FeatureStore(path).matchFeatures()
+    else:
+        data = pd.read_csv(path)
+        data = data.drop(columns=['Unnamed: 0'], errors='ignore')
+    # A whole season is missing card data, so the card columns are dropped
+    data = data.drop(columns=['home_CrdY','home_CrdR','away_CrdY','away_CrdR'])
+    features = data.drop(columns=['HomeTeam','AwayTeam','Season','FTR']).to_numpy(dtype=np.float64)
+    labels = data['FTR'].to_numpy()
+
+    scaler = StandardScaler().fit(features)
+    scaledData = scaler.transform(features)
+    pca = PCA(n_components=10, random_state=seed).fit(scaledData)
+    pcaScaledData = pca.transform(scaledData)
+
+    trainIdx, testIdx = train_test_split(np.arange(len(labels)), test_size=testSize, random_state=seed, stratify=labels)
+    # Folds are materialised once so every search scores exactly the same splits
+    folds = list(StratifiedKFold(n_splits=nFolds, shuffle=True, random_state=seed).split(trainIdx, labels[trainIdx]))
+
+    return {'scaledData': scaledData, 'pcaScaledData': pcaScaledData, 'labels': labels,
+            'trainIdx': trainIdx, 'testIdx': testIdx, 'folds': folds, 'pca': pca, 'scaler': scaler}
+
+def logisticGrid():
+    # 'none' became None in scikit-learn 1.2 and multi_class was deprecated in 1.5
+    grid = {'solver' : ['lbfgs', 'newton-cg', 'sag'],
+            'penalty' : ['none' if SKLEARN_VERSION < (1, 2) else None, 'l2'],
+            'fit_intercept' : [True, False],
+            'max_iter' : [1000]}
+    if SKLEARN_VERSION < (1, 5):
+        grid['multi_class'] = ['multinomial']
+    return grid
+
+def randomForestGrid():
+    return {'n_estimators': [int(x) for x in np.linspace(start = 10, stop = 200, num = 20)],
+            'max_features': ['sqrt', 'log2'],
+            'max_depth': [int(x) for x in np.linspace(10, 110, num = 11)],
+            'min_samples_split': [2, 5, 10],
+            'min_samples_leaf': [1, 2, 4],
+            'bootstrap': [True, False]}
+
+def fineRandomForestGrid(r_params):
+    # Narrow grid around the coarse search's best parameters, as in the notebook
+    return {'n_estimators': sorted({max(1, int(x)) for x in np.linspace(start = r_params['n_estimators']-5, stop = r_params['n_estimators']+4, num = 10)}),
+            'max_features': [r_params['max_features']],
+            'max_depth': sorted({max(1, int(x)) for x in np.linspace(start = r_params['max_depth']-5, stop = r_params['max_depth']+4, num = 5)}),
+            'min_samples_split': sorted({max(2, int(x)) for x in np.linspace(start = r_params['min_samples_split']-2, stop = r_params['min_samples_split']+2, num = 3)}),
+            'min_samples_leaf': sorted({max(1, int(x)) for x in np.linspace(start = r_params['min_samples_leaf']-1, stop = r_params['min_samples_leaf']+1, num = 3)}),
+            'bootstrap': [r_params['bootstrap']]}
+
+def gridSearch(estimator, grid, folds, search, jobs, seed):
+    if search == 'halving':
+        from sklearn.experimental import enable_halving_search_cv
+        from sklearn.model_selection import HalvingGridSearchCV
+        return HalvingGridSearchCV(estimator, grid, cv=folds, n_jobs=jobs, random_state=seed)
+    return GridSearchCV(estimator, grid, cv=folds, n_jobs=jobs)
+
+def randomSearch(estimator, grid, folds, search, jobs, seed, nIter=100):
+    if search == 'halving':
+        from sklearn.experimental import enable_halving_search_cv
+        from sklearn.model_selection import HalvingRandomSearchCV
+        return HalvingRandomSearchCV(estimator, grid, n_candidates=nIter, cv=folds, n_jobs=jobs, random_state=seed)
+    return RandomizedSearchCV(estimator, grid, n_iter=nIter, cv=folds, n_jobs=jobs, random_state=seed)
+
+def trainSupportVector(prepared, args):
+    trainX = prepared['pcaScaledData'][prepared['trainIdx']]
+    svm = SVC(kernel='rbf', C=1, max_iter=-1).fit(trainX, prepared['labels'][prepared['trainIdx']])
+    # Saved with its PCA so it takes the same 48 scaled features as the other models
+    model = Pipeline([('pca', prepared['pca']), ('svc', svm)])
+    return model, {'kernel': 'rbf', 'C': 1}, prepared['scaledData']
+
+def trainLogisticRegression(prepared, args):
+    trainX = prepared['scaledData'][prepared['trainIdx']]
+    trainY = prepared['labels'][prepared['trainIdx']]
+    lr_grid = gridSearch(LogisticRegression(), logisticGrid(), prepared['folds'], args.search, args.jobs, args.seed)
+    lr_grid.fit(trainX, trainY)
+    return lr_grid.best_estimator_, lr_grid.best_params_, prepared['scaledData']
+
+def trainRandomForest(prepared, args):
+    trainX = prepared['scaledData'][prepared['trainIdx']]
+    trainY = prepared['labels'][prepared['trainIdx']]
+    rf = RandomForestClassifier(random_state=args.seed)
+    # Coarse random search, then a fine grid around its best parameters
+    rf_random = randomSearch(rf, randomForestGrid(), prepared['folds'], args.search, args.jobs, args.seed)
+    rf_random.fit(trainX, trainY)
+    rf_grid = gridSearch(rf, fineRandomForestGrid(rf_random.best_params_), prepared['folds'], args.search, args.jobs, args.seed)
+    rf_grid.fit(trainX, trainY)
+    return rf_grid.best_estimator_, rf_grid.best_params_, prepared['scaledData']
+
+def trainNeuralNetwork(prepared, args):
+    # TensorFlow is only imported when the ANN is requested
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(args.seed)
+    trainX = prepared['scaledData'][prepared['trainIdx']]
+    trainY = prepared['labels'][prepared['trainIdx']]
+    model = tf.keras.Sequential([
+        tf.keras.layers.Dense(48, input_shape=(48,), activation=tf.nn.relu, kernel_regularizer=tf.keras.regularizers.L2(0.01)),
+        tf.keras.layers.Dropout(0.2),
+        tf.keras.layers.Dense(24, activation=tf.nn.relu, kernel_regularizer=tf.keras.regularizers.L2(0.01)),
+        tf.keras.layers.Dropout(0.2),
+        tf.keras.layers.Dense(24, activation=tf.nn.relu, kernel_regularizer=tf.keras.regularizers.L2(0.01)),
+        tf.keras.layers.Dense(len(np.unique(trainY)), activation=tf.nn.softmax)
+    ])
+    model.compile(optimizer=tf.keras.optimizers.SGD(),
+                  loss=tf.keras.losses.SparseCategoricalCrossentropy(),
+                  metrics=tf.keras.metrics.SparseCategoricalAccuracy())
+    model.fit(trainX, trainY, epochs=args.epochs, validation_split=0.4, verbose=0)
+    return model, {'epochs': args.epochs}, prepared['scaledData']
+
+TRAINERS = {'supportvector': trainSupportVector, 'logisticreg': trainLogisticRegression,
+            'randomtree': trainRandomForest, 'ann': trainNeuralNetwork}
+
+def score(model, features, labels):
+    if hasattr(model, 'score'):
+        return float(model.score(features, labels))
+    # Keras models
+    return float((np.argmax(model.predict(features, verbose=0), axis=-1) == labels).mean())
+
+def saveArtefact(name, model, manifest, modelsDir, version, promote):
+    # Every run writes models/versions/<name>-<version>.* plus a JSON manifest; --promote also replaces the default.
+    # The versions live in a subdirectory so discoverModels does not load them next to the defaults
+    versionsDir = os.path.join(modelsDir, VERSIONS_DIR)
+    os.makedirs(versionsDir, exist_ok=True)
+    if name == 'ann':
+        path = os.path.join(versionsDir, f'{name}-{version}')
+        model.save(path)
+    else:
+        path = os.path.join(versionsDir, f'{name}-{version}.sav')
+        joblib.dump(model, path)
+    with open(os.path.join(versionsDir, f'{name}-{version}.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    if promote:
+        target = os.path.join(modelsDir, name if name == 'ann' else name + '.sav')
+        if os.path.isdir(path):
+            shutil.rmtree(target, ignore_errors=True)
+            shutil.copytree(path, target)
+        else:
+            shutil.copyfile(path, target)
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the match outcome models from data/fulldata.csv or a feature store directory.")
+    parser.add_argument('models', nargs='*', default=['supportvector', 'logisticreg', 'randomtree'],
+                        help=f"models to train, from {', '.join(MODEL_NAMES)}")
+    parser.add_argument('--competition', default=DEFAULT_COMPETITION, help=f"from {', '.join(COMPETITIONS)}")
+    parser.add_argument('--data', help="fulldata.csv-style CSV or feature store directory, by default the competition's fulldata.csv")
+    parser.add_argument('--models-dir', help="by default models/ for the Premier League and models/<competition> otherwise")
+    parser.add_argument('--search', choices=['grid', 'halving'], default='halving',
+                        help="exhaustive searches as in the notebook, or successive halving")
+    parser.add_argument('--jobs', type=int, default=-1, help="worker processes for the searches")
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--epochs', type=int, default=200, help="ANN training epochs")
+    parser.add_argument('--promote', action='store_true', help="also overwrite the default models/<name>.sav")
+    parser.add_argument('--no-cache', action='store_true', help="recompute the preprocessed features and folds")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.models) - set(MODEL_NAMES)
+    if unknown:
+        parser.error(f"unknown models: {', '.join(sorted(unknown))}")
+    competition = getCompetition(args.competition)
+    args.data = args.data or os.path.join(competition.dataDir(os.path.dirname(DATA_PATH)), os.path.basename(DATA_PATH))
+    args.models_dir = args.models_dir or competition.modelsDir(MODELS_DIR)
+    os.makedirs(args.models_dir, exist_ok=True)
+
+    memory = joblib.Memory(None if args.no_cache else CACHE_DIR, verbose=0)
+    prepared = memory.cache(prepareData)(args.data, fileFingerprint(args.data), args.test_size, args.seed, args.folds)
+    labels = prepared['labels']
+    version = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+
+    for name in args.models:
+        start = time.perf_counter()
+        model, params, features = TRAINERS[name](prepared, args)
+        manifest = {'model': name, 'competition': competition.key, 'version': version, 'params': params, 'search': args.search, 'seed': args.seed,
+                    'data': fileFingerprint(args.data), 'sklearn': sklearn.__version__,
+                    'trainSeconds': time.perf_counter() - start,
+                    'trainAccuracy': score(model, features[prepared['trainIdx']], labels[prepared['trainIdx']]),
+                    'testAccuracy': score(model, features[prepared['testIdx']], labels[prepared['testIdx']])}
+        path = saveArtefact(name, model, manifest, args.models_dir, version, args.promote)
+        print(f"{name}: test accuracy {manifest['testAccuracy']:.3f} in {manifest['trainSeconds']:.1f}s -> {path}", file=sys.stderr)
+
+### Entry point ###
+if __name__ == "__main__":
+    main()